@@ -0,0 +1,234 @@
+"""End-to-end benchmarks of the sales prediction pipeline on synthetic eKasa data.
+
+Usage (from project root):
+    python benchmarks/run_benchmarks.py --sizes small medium
+    python benchmarks/run_benchmarks.py --sizes small medium --save-baseline
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+
+from sklearn.pipeline import Pipeline
+
+from src import instrumentation
+from src.data.make_dataset import load_dataset
+from src.data.synthetic import write_synthetic_dataset
+from src.features.build_features import (MetadataTransformer, CalendarTransformer, HolidaysTransformer,
+                                         HolidayDistanceTransformer, LaggedSalesTransformer,
+                                         WeekdayAveragesTransformer, fill_series)
+from src.models.train_model import train_booster, TARGET, PREDICTORS
+from src.models.predict_model import predict
+from src.evaluation.scoring import calculate_errors
+from src.streamlit_app.queries import (get_inventory_on_current_date, get_aggregated_predictions,
+                                       get_last_365d_sales, KPIsCalculation,
+                                       calculate_scores_per_item_last_365d)
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+LAST_YEAR = 2019
+
+SIZES = {
+    'small': {'n_years': 2, 'n_items': 20, 'receipts_per_day': 50},
+    'medium': {'n_years': 3, 'n_items': 100, 'receipts_per_day': 300},
+    'large': {'n_years': 5, 'n_items': 500, 'receipts_per_day': 2000},
+}
+
+NUM_BOOST_ROUND = 50
+
+
+def measure(func, *args, repeat=1, profile_memory=True, name='measure'):
+    """Run func and return its result, best wall time (s) and peak traced memory (MB).
+    Memory is measured in a separate run so tracemalloc does not inflate timings.
+    With instrumentation enabled (CAFFE_BAR_TRACE), tracing started by it is left running
+    and memory run is measured as stage: instrumented stages reset tracemalloc peak and
+    pass their peaks to the enclosing stage.
+    """
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            result = func(*args)
+        timings.append(time.perf_counter() - start_time)
+    peak_mb = None
+    if profile_memory:
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        with redirect_stdout(io.StringIO()), instrumentation.stage(f'benchmark_{name}') as record:
+            func(*args)
+        # Stage peak is None if instrumentation (or its memory tracing) is disabled
+        peak_mb = record.peak_mb if record.peak_mb is not None else (
+            (tracemalloc.get_traced_memory()[1] - start_memory) / 2**20)
+        if not was_tracing:
+            tracemalloc.stop()
+    return result, min(timings), peak_mb
+
+
+def run_stage(results, stage, func, *args, repeat=1, profile_memory=True):
+    result, seconds, peak_mb = measure(func, *args, repeat=repeat, profile_memory=profile_memory, name=stage)
+    results[stage] = {'seconds': round(seconds, 4), 'peak_mb': None if peak_mb is None else round(peak_mb, 2)}
+    return result
+
+
+def stage_fill_time_series(dataset):
+    return fill_series(dataset.set_index('sales_date'))
+
+
+def stage_pipeline(dataset_filled):
+    pipeline = Pipeline(steps=[
+        ('metadata_tf', MetadataTransformer()),
+        ('calendar_tf', CalendarTransformer()),
+        ('holidays_tf', HolidaysTransformer()),
+        ('holiday_distance_tf', HolidayDistanceTransformer()),
+        ('lagged_sales_tf', LaggedSalesTransformer()),
+        ('weekday_averages_tf', WeekdayAveragesTransformer())
+    ])
+    return pipeline.fit_transform(dataset_filled)
+
+
+def stage_training(dataset_w_feats):
+    train_mask = (dataset_w_feats.index < f'{LAST_YEAR}-01-01')
+    return train_booster(dataset_w_feats[train_mask], PREDICTORS, num_boost_round=NUM_BOOST_ROUND)
+
+
+def stage_scoring(booster, dataset_w_feats, dataset_filled):
+    dataset_w_preds = predict(booster, dataset_w_feats)
+    # Dashboard datasets keep sales value which is dropped by MetadataTransformer
+    dataset_w_preds.loc[:, 'sales_value'] = dataset_filled['sales_value'].values
+    train_mask = (dataset_w_preds.index < f'{LAST_YEAR}-01-01')
+    calculate_errors(dataset_w_preds[train_mask][TARGET], dataset_w_preds[~train_mask][TARGET],
+                     dataset_w_preds[train_mask]['prediction'], dataset_w_preds[~train_mask]['prediction'])
+    return dataset_w_preds
+
+
+def stage_dashboard_queries(dataset_with_predictions, dataset_with_inventory):
+    current_date = datetime.date(LAST_YEAR, 3, 1)
+    selected_date = current_date + datetime.timedelta(days=7)
+    all_items = dataset_with_predictions.item_name.unique().tolist()
+    kpis_calculation = KPIsCalculation(current_date)
+    kpis_calculation.get_yoy_sales(dataset_with_predictions)
+    kpis_calculation.get_yoy_predictions(dataset_with_predictions)
+    kpis_calculation.get_yoy_inventory(dataset_with_inventory)
+    get_inventory_on_current_date(dataset_with_inventory, all_items, current_date)
+    get_aggregated_predictions(dataset_with_predictions, all_items, current_date, selected_date)
+    get_last_365d_sales(dataset_with_predictions, all_items, current_date)
+    calculate_scores_per_item_last_365d(dataset_with_predictions, current_date)
+
+
+def make_inventory(dataset_with_predictions):
+    # Weekly restocking of one week of average sales, good enough for query benchmarks
+    inventory_df = dataset_with_predictions[['item_name', TARGET]].copy()
+    average_sales = inventory_df.groupby('item_name')[TARGET].transform('mean')
+    inventory_df.loc[:, 'inventory'] = (average_sales * (7 - inventory_df.index.day_of_week)).round()
+    return inventory_df
+
+
+def run_size(size_name, size_params, repeat=1, profile_memory=True):
+    years = [str(year) for year in range(LAST_YEAR - size_params['n_years'] + 1, LAST_YEAR + 1)]
+    options = {'repeat': repeat, 'profile_memory': profile_memory}
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        _, seconds, _ = measure(write_synthetic_dataset, data_dir, years, size_params['n_items'],
+                                size_params['receipts_per_day'], profile_memory=False)
+        print(f"[{size_name}] synthetic data written in {seconds:.2f} s")
+
+        dataset = run_stage(results, 'load_dataset', load_dataset, data_dir, years, **options)
+    dataset_filled = run_stage(results, 'fill_time_series', stage_fill_time_series, dataset, **options)
+    dataset_w_feats = run_stage(results, 'feature_pipeline', stage_pipeline, dataset_filled, **options)
+    booster = run_stage(results, 'training', stage_training, dataset_w_feats, **options)
+    dataset_w_preds = run_stage(results, 'scoring', stage_scoring, booster, dataset_w_feats, dataset_filled, **options)
+    dataset_w_inventory = make_inventory(dataset_w_preds)
+    run_stage(results, 'dashboard_queries', stage_dashboard_queries, dataset_w_preds, dataset_w_inventory, **options)
+
+    results['rows'] = {'daily_sales': len(dataset), 'filled': len(dataset_filled)}
+    return results
+
+
+def find_regressions(results, baseline, time_tolerance, memory_tolerance, min_seconds=0.05):
+    """Compare results with baseline, return list of regression descriptions.
+    Time differences smaller than min_seconds are treated as noise.
+    """
+    regressions = []
+    for size_name, stages in results.items():
+        for stage, current in stages.items():
+            reference = baseline.get(size_name, {}).get(stage)
+            if stage == 'rows' or reference is None:
+                continue
+            if (current['seconds'] > reference['seconds'] * (1 + time_tolerance)
+                    and current['seconds'] - reference['seconds'] > min_seconds):
+                regressions.append(f"{size_name}/{stage}: time {current['seconds']:.3f} s vs baseline {reference['seconds']:.3f} s")
+            if (current['peak_mb'] is not None and reference.get('peak_mb') is not None
+                    and current['peak_mb'] > reference['peak_mb'] * (1 + memory_tolerance)):
+                regressions.append(f"{size_name}/{stage}: peak memory {current['peak_mb']:.1f} MB vs baseline {reference['peak_mb']:.1f} MB")
+    return regressions
+
+
+def print_results(results):
+    for size_name, stages in results.items():
+        print(f"\n{size_name} ({stages['rows']['daily_sales']} daily rows, {stages['rows']['filled']} filled rows)")
+        print(f"{'stage':<20}{'time (s)':>12}{'peak (MB)':>12}")
+        for stage, values in stages.items():
+            if stage == 'rows':
+                continue
+            peak_mb = '-' if values['peak_mb'] is None else f"{values['peak_mb']:.1f}"
+            print(f"{stage:<20}{values['seconds']:>12.3f}{peak_mb:>12}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark pipeline stages on synthetic data.')
+    parser.add_argument('--sizes', nargs='+', default=['small'], choices=list(SIZES.keys()))
+    parser.add_argument('--repeat', type=int, default=1, help='Timed runs per stage, best one is kept.')
+    parser.add_argument('--no-memory', action='store_true', help='Skip tracemalloc memory profiling.')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Save results as new baseline.')
+    parser.add_argument('--output', default=None, help='Write results to this JSON file.')
+    parser.add_argument('--time-tolerance', type=float, default=0.25)
+    parser.add_argument('--memory-tolerance', type=float, default=0.10)
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='Ignore smaller time differences.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = {size_name: run_size(size_name, SIZES[size_name], args.repeat, not args.no_memory)
+               for size_name in args.sizes}
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline found at {args.baseline}, run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = find_regressions(results, baseline, args.time_tolerance, args.memory_tolerance, args.min_seconds)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
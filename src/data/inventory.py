@@ -0,0 +1,61 @@
+"""Simulated inventory of top selling items, as in notebooks/inventory_simulation.ipynb.
+
+Every series starts with restock quantity (restock_factor times maximum daily sales of the
+previous year) and is restocked with it on the day after it ran out.
+"""
+import numpy as np
+import pandas as pd
+from src.data.make_dataset import SERIES_KEYS
+from src.instrumentation import instrument
+
+TOP_N_ITEMS = 40
+RESTOCK_FACTOR = 2
+
+
+def inventory_simulation(sales: np.ndarray, restock: np.ndarray) -> np.ndarray:
+    """End of day inventory of one series from daily sales and restock quantities."""
+    inventory = np.zeros(len(sales))
+    for i, (sale, start_stock) in enumerate(zip(sales, restock)):
+        if i == 0:
+            stock = start_stock - sale
+        elif stock <= 0:
+            stock += start_stock
+        else:
+            stock -= sale
+        inventory[i] = max(stock, 0)
+    return inventory
+
+
+@instrument('simulate_inventory', rows_out=len)
+def simulate_inventory(data_df: pd.DataFrame,
+                       top_n: int = TOP_N_ITEMS,
+                       restock_factor: float = RESTOCK_FACTOR) -> pd.DataFrame:
+    """Simulate daily inventory of top_n items by sales quantity.
+
+    Parameters:
+    -----------
+    data_df: filled daily sales (see fill_series) with DatetimeIndex, series keys and 'sales_qty'
+    top_n: number of items with the highest total sales quantity
+    restock_factor: restock quantity as multiple of previous year maximum daily sales
+                    (of the first year with sales if there is no previous year)
+
+    Returns:
+    --------
+    inventory_df: series keys, 'sales_qty' and 'inventory' per day
+    """
+    keys = [key for key in SERIES_KEYS if key in data_df.columns]
+    top_items = data_df.groupby('item_name')['sales_qty'].sum().nlargest(top_n).index
+    inventory_df = data_df.loc[data_df['item_name'].isin(top_items), keys + ['sales_qty']]
+    series_years = [inventory_df[key] for key in keys] + [inventory_df.index.year]
+    yearly_max = inventory_df['sales_qty'].groupby(series_years).max()
+    previous_year_max = yearly_max.rename(index=lambda year: year + 1, level=len(keys))
+    restock = previous_year_max.reindex(pd.MultiIndex.from_arrays(series_years)).values
+    own_year_max = yearly_max.reindex(pd.MultiIndex.from_arrays(series_years)).values
+    sales, dates = inventory_df['sales_qty'].values, inventory_df.index.values
+    inventory = np.zeros(len(inventory_df))
+    for rows in inventory_df.groupby(keys, sort=False).indices.values():
+        rows = rows[np.argsort(dates[rows], kind='stable')]
+        # First year of series is restocked with maximum of the following year, as in notebook
+        series_restock = pd.Series(restock[rows]).bfill().fillna(pd.Series(own_year_max[rows])).values
+        inventory[rows] = inventory_simulation(sales[rows], series_restock * restock_factor)
+    return inventory_df.assign(inventory=inventory)
@@ -2,10 +2,21 @@ import os
 import time
 import pandas as pd
 from src.utils import get_project_root
+from src.instrumentation import instrument, stage
 from src.data.item_names_replacement import REPLACE_DICT1, REPLACE_DICT1
 
 YEARS = [str(x) for x in list(range(2013,2021))]
 ROOT_DIR = get_project_root()
+RAW_DATA_DIR = os.path.join(ROOT_DIR, 'data/raw')
+# Dashboard reads datasets from this folder
+PROCESSED_DATA_DIR = os.path.join(ROOT_DIR, 'data/processed')
+# Daily sales are one time series per bar (store) and item
+SERIES_KEYS = ['bar_name', 'item_name']
+# Attributes constant per item, used for hierarchical forecasts
+SERIES_ATTRIBUTES = ['item_class']
+# Candidate formats of 'sales_datetime', 'ISO8601' covers dates with and without fractional seconds
+DATETIME_FORMATS = ['%Y-%m-%d %H:%M:%S', 'ISO8601', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y. %H:%M:%S', '%d.%m.%Y %H:%M']
+DATETIME_FORMAT_SAMPLE_SIZE = 1000
 
 
 def string_to_float(number):
@@ -33,46 +44,124 @@ def load_data(data_abs_path: str) -> pd.DataFrame:
     data_df.set_index('sales_datetime', inplace=True)
     return data_df
 
+def detect_datetime_format(datetime_strings: pd.Series) -> str:
+    """Pick format from DATETIME_FORMATS which parses most of sampled values, None if none does."""
+    # Evenly spaced sample over the file, missing values are dropped only from the sample
+    step = max(len(datetime_strings) // DATETIME_FORMAT_SAMPLE_SIZE, 1)
+    sample = datetime_strings.iloc[::step].dropna()
+    best_format, best_parsed = None, 0
+    for datetime_format in DATETIME_FORMATS:
+        parsed = pd.to_datetime(sample, format=datetime_format, errors='coerce').notna().sum()
+        if parsed > best_parsed:
+            best_format, best_parsed = datetime_format, parsed
+        if parsed == len(sample):
+            break
+    return best_format
+
+
+@instrument('parse_datetimes')
+def parse_datetimes(datetime_strings: pd.Series) -> pd.Series:
+    """Parse datetimes of one file with single detected format (vectorized),
+    only values which fail are parsed with slow per element 'mixed' format.
+
+    For ISO files ('%Y-%m-%d ...', 'ISO8601') results are the same as parsing with
+    format='mixed' only and parsing is ~1.5x faster. Day first files ('%d.%m.%Y ...') are
+    parsed ~10x faster, but
+    dates are read as day.month: 'mixed' reads ambiguous dates (day <= 12) month first,
+    eg. '03.04.2019' was 4 March and is now 3 April. Failed values of day first files
+    are parsed with dayfirst=True to keep one convention per file.
+    """
+    datetime_format = detect_datetime_format(datetime_strings)
+    if datetime_format is None:
+        return pd.to_datetime(datetime_strings, format='mixed', utc=True)
+    datetimes = pd.to_datetime(datetime_strings, format=datetime_format, errors='coerce', utc=True)
+    failed = datetimes.isna() & datetime_strings.notna()
+    if failed.any():
+        datetimes[failed] = pd.to_datetime(datetime_strings[failed], format='mixed', utc=True,
+                                           dayfirst=datetime_format.startswith('%d'))
+    return datetimes
+
+
+@instrument('arrange_data')
 def arrange_data(data_df):
     # Drop unnecessary columns -> no known meaning
     data_df.drop(labels=[4,10,11], axis=1, inplace=True)
     data_df.columns = ['bar_name', 'number2', 'feature1', 'sales_datetime', 'feature2', 
                           'item_name', 'item_class', 'sales_qty', 'feature3', 'sales_value']
     #data_df.sales_value=data_df.sales_value.apply(lambda x: string_to_float(x))
-    data_df.sales_datetime = pd.to_datetime(data_df.sales_datetime, format='mixed', utc=True)
+    data_df.sales_datetime = parse_datetimes(data_df.sales_datetime)
     data_df.set_index('sales_datetime', inplace=True)
     data_df['item_price'] = abs(data_df['sales_value']/data_df['sales_qty'])
     return data_df
 
-def load_dataset():
+@instrument('aggregate_hourly')
+def aggregate_hourly(data_df: pd.DataFrame) -> pd.DataFrame:
+    """Sum sales quantity and value per bar, item, day and hour of day.
+    Dataframe must have DatetimeIndex of receipt entries.
+    """
+    sales_date = data_df.index.floor('D').rename('sales_date')
+    hour = data_df.index.hour.rename('hour')
+    return data_df.groupby([data_df.bar_name, data_df.item_name, sales_date, hour])[['sales_qty', 'sales_value']].sum().reset_index()
 
-    columns_to_keep = ['item_name', 'sales_qty', 'sales_value', 'item_price']
+
+@instrument('load_dataset')
+def load_dataset(data_dir: str = RAW_DATA_DIR, years: list = YEARS, hourly: bool = False):
+    """Load yearly eKasa receipt entries and aggregate them to daily sales per bar and item.
+
+    Parameters:
+    -----------
+    data_dir: folder with {year}_eKasa_RECEIPT_ENTRIES.csv files
+    years: years to load
+    hourly: also aggregate sales per hour of day, from the same read of raw files
+
+    Returns:
+    --------
+    all_data_daily_sales: daily sales dataframe
+    all_data_hourly_sales: hourly sales dataframe (bar, item, day, hour), only if hourly is True
+    """
+    columns_to_keep = ['bar_name', 'item_name', 'item_class', 'sales_qty', 'sales_value', 'item_price']
     all_data_df = pd.DataFrame(columns = columns_to_keep)
-    for year in YEARS:
-        start_time = time.time()
-        filename = os.path.join(ROOT_DIR, f'data/raw/{year}_eKasa_RECEIPT_ENTRIES.csv') 
-        df = pd.read_csv(filename, 
-                         delimiter=';', 
-                         header=None,
-                         converters={12: string_to_float},
-                         encoding='latin-1')
+    hourly_sales = []
+    for year in years:
+        filename = os.path.join(data_dir, f'{year}_eKasa_RECEIPT_ENTRIES.csv') 
+        with stage('read_csv') as record:
+            df = pd.read_csv(filename, 
+                             delimiter=';', 
+                             header=None,
+                             converters={12: string_to_float},
+                             encoding='latin-1')
+            record.rows_out = len(df)
         data_df = arrange_data(df)
         all_data_df = pd.concat([all_data_df, data_df[columns_to_keep]])
+        if hourly:
+            hourly_sales.append(aggregate_hourly(data_df))
         print("Dataframe shape: ",df.shape)
         #print("Dataframe head: ",df.head())
-        end_time = time.time()
-        print("Time (s): ", end_time-start_time)
         print(f"{year} done.")
     all_data_df.sales_qty = all_data_df.sales_qty.astype('int64')
     all_data_df.item_name.replace(to_replace=REPLACE_DICT1, inplace=True)
     all_data_df.item_name.replace(to_replace=REPLACE_DICT1, inplace=True)
     all_data_df.index.name = 'sales_date'
-    all_data_daily_sales = all_data_df.groupby(['item_name', pd.Grouper(freq='D')]).agg({'sales_qty':'sum', 
-                                                                                          'item_price': 'mean', 
-                                                                                         'sales_value': 'sum'}).reset_index()
+    with stage('daily_aggregation', rows_in=len(all_data_df)) as record:
+        all_data_daily_sales = all_data_df.groupby(SERIES_KEYS + [pd.Grouper(freq='D')]).agg({'sales_qty':'sum', 
+                                                                                              'item_price': 'mean', 
+                                                                                             'sales_value': 'sum'}).reset_index()
+        # Latest item class is used so that every item belongs to exactly one class
+        item_classes = all_data_df.groupby('item_name')['item_class'].last()
+        all_data_daily_sales.loc[:, 'item_class'] = all_data_daily_sales.item_name.map(item_classes)
+        record.rows_out = len(all_data_daily_sales)
     print(all_data_daily_sales.head())
+    if not hourly:
+        return all_data_daily_sales
+
+    all_data_hourly_sales = pd.concat(hourly_sales, ignore_index=True)
+    all_data_hourly_sales.item_name.replace(to_replace=REPLACE_DICT1, inplace=True)
+    # Renamed items can have the same name now, so they are summed again
+    all_data_hourly_sales = all_data_hourly_sales.groupby(SERIES_KEYS + ['sales_date', 'hour'])[['sales_qty', 'sales_value']].sum().reset_index()
+    all_data_hourly_sales.loc[:, 'item_class'] = all_data_hourly_sales.item_name.map(item_classes)
+    all_data_hourly_sales.sales_qty = all_data_hourly_sales.sales_qty.astype('int64')
 
-    return all_data_daily_sales
+    return all_data_daily_sales, all_data_hourly_sales
 
 
 def load_dataset_debug():
@@ -0,0 +1,120 @@
+import os
+import re
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from src.instrumentation import instrument, stage
+from src.data.make_dataset import YEARS
+
+RAW_FILENAME = '{year}_eKasa_RECEIPT_ENTRIES.csv'
+BAR_NAME_COLUMN = 0
+CHUNKSIZE = 200000
+
+
+def store_key(bar_name: str) -> str:
+    """Filesystem safe shard name of a bar (store), eg. 'Caffe bar Centar' -> 'caffe_bar_centar'."""
+    return re.sub(r'[^0-9a-z]+', '_', str(bar_name).lower()).strip('_')
+
+
+def partition_year_by_store(year: str, data_dir: str, shards_dir: str, chunksize: int = CHUNKSIZE) -> dict:
+    """Split one raw yearly file into per store files {shards_dir}/{store}/{year}_eKasa_RECEIPT_ENTRIES.csv.
+    File is read in chunks so memory is bounded by chunksize, rows are kept as raw strings.
+
+    Returns:
+    --------
+    rows_per_store: number of written rows per store key
+    """
+    filename = os.path.join(data_dir, RAW_FILENAME.format(year=year))
+    rows_per_store = {}
+    with stage('partition_year_by_store') as record:
+        for chunk in pd.read_csv(filename, delimiter=';', header=None, dtype=str,
+                                 keep_default_na=False, encoding='latin-1', chunksize=chunksize):
+            for bar_name, store_df in chunk.groupby(BAR_NAME_COLUMN, sort=False):
+                key = store_key(bar_name)
+                store_dir = os.path.join(shards_dir, key)
+                os.makedirs(store_dir, exist_ok=True)
+                # First chunk of a store overwrites old shard file, following ones are appended
+                store_df.to_csv(os.path.join(store_dir, RAW_FILENAME.format(year=year)),
+                                sep=';', header=False, index=False, encoding='latin-1',
+                                mode='a' if key in rows_per_store else 'w')
+                rows_per_store[key] = rows_per_store.get(key, 0) + len(store_df)
+        record.rows_out = sum(rows_per_store.values())
+    return rows_per_store
+
+
+def run_sharded(func, shards: list, n_workers: int = None, return_exceptions: bool = False,
+                shard_kwargs: dict = None, **kwargs) -> dict:
+    """Run func(shard, **kwargs) for every shard in parallel worker processes.
+    Every worker process holds only the shard it is working on, results should be small
+    (eg. paths of saved outputs or summaries).
+
+    Parameters:
+    -----------
+    return_exceptions: if True, exception of failed shard is returned as its result and
+                       other shards are still processed, otherwise it is raised
+    shard_kwargs: extra keyword arguments per shard (eg. only data the shard needs),
+                  they are sent only to the worker of that shard
+
+    Returns:
+    --------
+    results: func results (or exceptions) per shard
+    """
+    def result(call):
+        try:
+            return call()
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return e
+
+    shard_kwargs = shard_kwargs or {}
+    if n_workers == 1:
+        return {shard: result(lambda: func(shard, **kwargs, **shard_kwargs.get(shard, {}))) for shard in shards}
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {shard: executor.submit(func, shard, **kwargs, **shard_kwargs.get(shard, {})) for shard in shards}
+        return {shard: result(future.result) for shard, future in futures.items()}
+
+
+@instrument('partition_raw_by_store')
+def partition_raw_by_store(data_dir: str, shards_dir: str, years: list = YEARS,
+                           n_workers: int = None, chunksize: int = CHUNKSIZE) -> list:
+    """Split raw yearly files into one folder per store (bar), yearly files are processed in parallel.
+    Every store folder can be loaded with load_dataset(store_dir, store_years(store_dir)).
+
+    Returns:
+    --------
+    store_dirs: list of store shard folders
+    """
+    run_sharded(partition_year_by_store, years, n_workers,
+                data_dir=data_dir, shards_dir=shards_dir, chunksize=chunksize)
+    return list_store_shards(shards_dir)
+
+
+def list_store_shards(shards_dir: str) -> list:
+    return sorted(os.path.join(shards_dir, name) for name in os.listdir(shards_dir)
+                  if os.path.isdir(os.path.join(shards_dir, name)))
+
+
+def store_years(store_dir: str, years: list = YEARS) -> list:
+    """Years for which store has data (bars can open or close during the years)."""
+    return [year for year in years if os.path.exists(os.path.join(store_dir, RAW_FILENAME.format(year=year)))]
+
+
+@instrument('merge_store_results')
+def merge_store_results(paths: list) -> pd.DataFrame:
+    """Concatenate per store results saved as pickles."""
+    return pd.concat([pd.read_pickle(path) for path in paths])
+
+
+@instrument('aggregate_across_stores')
+def aggregate_across_stores(data_df: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate per store daily data to totals per item and day over all stores.
+    Quantities, values, predictions and inventory are summed and item price is averaged.
+    Dataframe must have daily DatetimeIndex.
+    """
+    aggregations = {col: 'sum' for col in ['sales_qty', 'sales_value', 'prediction', 'inventory'] if col in data_df.columns}
+    if 'item_price' in data_df.columns:
+        aggregations['item_price'] = 'mean'
+    if 'item_class' in data_df.columns:
+        aggregations['item_class'] = 'first'
+    index_name = data_df.index.name
+    return data_df.groupby([data_df.index, 'item_name']).agg(aggregations).reset_index(level='item_name').rename_axis(index_name)
@@ -1,6 +1,8 @@
 import pandas as pd
 import itertools
+from src.instrumentation import instrument
 
+@instrument('split_dataset', rows_out=lambda splits: len(splits[0]) + len(splits[1]))
 def split_dataset(all_data_df: pd.DataFrame, 
                   test_split_date: str, 
                   dependent_var: str):
@@ -15,6 +17,7 @@ def split_dataset(all_data_df: pd.DataFrame,
     print(f"Test dataset is from {X_test.index.min().strftime('%Y-%m-%d')} to {X_test.index.max().strftime('%Y-%m-%d')}")
     return X_train, X_test, y_train, y_test
 
+@instrument('time_series_cv', rows_out=len)
 def time_series_cv(raw_data_filled_df, num_train_years, percentage_cut):
     """Custom time-series split in train-validation sets per year.
     If there are more than 3 years in training dataset:
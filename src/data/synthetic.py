@@ -0,0 +1,142 @@
+import os
+import numpy as np
+import pandas as pd
+
+BAR_NAMES = ['Caffe bar Centar']
+ITEM_CLASSES = ['Kava', 'Caj', 'Pivo', 'Sokovi', 'Voda', 'Zestoka pica', 'Vino']
+BASE_ITEMS = [
+    ('Kava s mlijekom', 'Kava'), ('Espresso', 'Kava'), ('Kava sa slagom', 'Kava'),
+    ('Capuccino', 'Kava'), ('Caj', 'Caj'), ('Ledeni caj', 'Caj'),
+    ('Ozujsko pivo', 'Pivo'), ('Karlovacko pivo', 'Pivo'), ('Tuborg toceno', 'Pivo'),
+    ('Coca cola', 'Sokovi'), ('Cedevita', 'Sokovi'), ('Narancada', 'Sokovi'),
+    ('Jamnica', 'Voda'), ('Jana', 'Voda'), ('Sljivovica', 'Zestoka pica'),
+    ('Visnjevaca', 'Zestoka pica'), ('Prosek', 'Vino'), ('Bijelo vino', 'Vino'),
+]
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATETIME_FORMAT_FRACTIONAL = '%Y-%m-%d %H:%M:%S.%f'
+MALFORMED_SALES_VALUE = '400.200.000.000.000.000'
+OPENING_HOUR = 7
+CLOSING_HOUR = 23
+
+
+def make_items(n_items: int) -> pd.DataFrame:
+    """Item catalogue with class, price and popularity weight.
+    First items are real-looking names, rest are numbered per item class.
+    """
+    names, classes = [], []
+    for num in range(n_items):
+        if num < len(BASE_ITEMS):
+            name, item_class = BASE_ITEMS[num]
+        else:
+            item_class = ITEM_CLASSES[num % len(ITEM_CLASSES)]
+            name = f'{item_class} {num:04d}'
+        names.append(name)
+        classes.append(item_class)
+    rng = np.random.default_rng(n_items)
+    # Zipf-like popularity so there is a long tail of rarely sold items
+    weights = 1.0 / np.arange(1, n_items + 1) ** 1.1
+    return pd.DataFrame({
+        'item_name': names,
+        'item_class': classes,
+        'item_code': np.arange(1000, 1000 + n_items),
+        'item_price': rng.choice([8.0, 10.0, 12.0, 14.0, 15.0, 18.0, 22.0], size=n_items),
+        'weight': weights / weights.sum()
+    })
+
+
+def generate_receipt_entries(year: int,
+                             items_df: pd.DataFrame,
+                             receipts_per_day: int = 50,
+                             malformed_ratio: float = 0.0005,
+                             fractional_ratio: float = 0.1,
+                             bar_names: list = BAR_NAMES,
+                             seed: int = 0) -> pd.DataFrame:
+    """Generate one year of raw receipt entries in eKasa layout.
+
+    Parameters:
+    -----------
+    year: calendar year to generate
+    items_df: item catalogue from make_items
+    receipts_per_day: average number of receipt entries per day and bar
+    malformed_ratio: share of rows with malformed 'sales_value' (eg. '400.200.000.000.000.000')
+    fractional_ratio: share of rows with fractional seconds in datetime (mixed format)
+    bar_names: bar names written to first column
+    seed: random seed
+
+    Returns:
+    --------
+    entries_df: dataframe with integer columns 0-12, same as raw csv read with header=None
+    """
+    rng = np.random.default_rng(seed + year)
+    days = pd.date_range(f'{year}-01-01', f'{year}-12-31', freq='D')
+    # Weekly and yearly seasonality of number of receipts
+    day_factor = (1.0 + 0.3 * (days.day_of_week >= 4)) * (1.0 + 0.4 * np.sin(2 * np.pi * (days.day_of_year - 100) / 365.0))
+    entries_per_day = rng.poisson(receipts_per_day * day_factor * len(bar_names))
+    n_rows = int(entries_per_day.sum())
+
+    day_idx = np.repeat(np.arange(len(days)), entries_per_day)
+    seconds = rng.integers(OPENING_HOUR * 3600, CLOSING_HOUR * 3600, size=n_rows)
+    microseconds = rng.integers(0, 1000000, size=n_rows)
+    sales_datetime = (days.values[day_idx]
+                      + seconds.astype('timedelta64[s]')
+                      + microseconds.astype('timedelta64[us]'))
+    order = np.argsort(sales_datetime, kind='stable')
+    sales_datetime = pd.Series(sales_datetime[order])
+
+    fractional = rng.random(n_rows) < fractional_ratio
+    datetime_str = np.where(fractional,
+                            sales_datetime.dt.strftime(DATETIME_FORMAT_FRACTIONAL),
+                            sales_datetime.dt.strftime(DATETIME_FORMAT))
+
+    item_idx = rng.choice(len(items_df), size=n_rows, p=items_df['weight'].values)
+    sales_qty = 1 + rng.poisson(0.3, size=n_rows)
+    item_price = items_df['item_price'].values[item_idx]
+    sales_value = pd.Series(sales_qty * item_price).map('{:.2f}'.format)
+    sales_value[rng.random(n_rows) < malformed_ratio] = MALFORMED_SALES_VALUE
+
+    return pd.DataFrame({
+        0: np.asarray(bar_names)[rng.integers(0, len(bar_names), size=n_rows)],
+        1: np.arange(1, n_rows + 1),
+        2: rng.integers(1, 4, size=n_rows),
+        3: datetime_str,
+        4: rng.integers(1, 10, size=n_rows),
+        5: items_df['item_code'].values[item_idx],
+        6: items_df['item_name'].values[item_idx],
+        7: items_df['item_class'].values[item_idx],
+        8: sales_qty,
+        9: item_price,
+        10: 25,
+        11: 0,
+        12: sales_value.values
+    })
+
+
+def write_synthetic_dataset(output_dir: str,
+                            years: list = None,
+                            n_items: int = 40,
+                            receipts_per_day: int = 50,
+                            malformed_ratio: float = 0.0005,
+                            bar_names: list = BAR_NAMES,
+                            seed: int = 0) -> list:
+    """Write synthetic {year}_eKasa_RECEIPT_ENTRIES.csv files which can be read
+    by load_dataset (semicolon delimited, no header, latin-1 encoding).
+
+    Returns:
+    --------
+    filenames: list of written file paths
+    """
+    if years is None:
+        years = [str(x) for x in range(2017, 2020)]
+    os.makedirs(output_dir, exist_ok=True)
+    items_df = make_items(n_items)
+    filenames = []
+    for year in years:
+        entries_df = generate_receipt_entries(int(year), items_df,
+                                              receipts_per_day=receipts_per_day,
+                                              malformed_ratio=malformed_ratio,
+                                              bar_names=bar_names,
+                                              seed=seed)
+        filename = os.path.join(output_dir, f'{year}_eKasa_RECEIPT_ENTRIES.csv')
+        entries_df.to_csv(filename, sep=';', header=False, index=False, encoding='latin-1')
+        filenames.append(filename)
+    return filenames
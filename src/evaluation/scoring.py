@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+from src.instrumentation import instrument
 
 
 
@@ -46,11 +47,20 @@ def wbias(actual: pd.Series, forecast: pd.Series):
     return round(score, 1)
 
 
+def wmape_rows(actual_sums: np.ndarray, abs_error_sums: np.ndarray) -> np.ndarray:
+    """WMAPE of many series at once from sums of actuals and absolute errors
+    (eg. per item of items x days matrix), same as wmape without rounding.
+    """
+    denominator = np.where(actual_sums == 0, 1.0, actual_sums)
+    return abs_error_sums / denominator * 100
+
+
 def bias(actual: pd.Series, forecast: pd.Series):
 
     return round((1 - (actual.sum() / forecast.sum()))*100, 1)
 
 
+@instrument('calculate_errors')
 def calculate_errors(y_train: pd.Series, 
                     y_test: pd.Series, 
                     y_pred_train: pd.Series, 
@@ -72,5 +82,20 @@ def calculate_errors(y_train: pd.Series,
     }
 
 
+def errors_per_group(data_df: pd.DataFrame,
+                     by,
+                     actual: str = 'sales_qty',
+                     forecast: str = 'prediction') -> pd.DataFrame:
+    """WMAPE and WBias of every group (eg. item or cutoff and item), computed from
+    group sums in one groupby instead of calling wmape and wbias per group.
 
-
+    Returns:
+    --------
+    errors_df: actual and forecast sums, wmape and wbias per group
+    """
+    errors_df = data_df.assign(abs_error=(data_df[forecast] - data_df[actual]).abs()).groupby(by).agg(
+        **{actual: (actual, 'sum'), forecast: (forecast, 'sum'), 'abs_error': ('abs_error', 'sum')})
+    denominator = errors_df[actual].where(errors_df[actual] != 0, 1.0)
+    errors_df['wmape'] = (errors_df['abs_error'] / denominator * 100).round(1)
+    errors_df['wbias'] = ((errors_df[forecast] - errors_df[actual]) / denominator * 100).round(1)
+    return errors_df.drop(columns='abs_error')
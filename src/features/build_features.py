@@ -1,24 +1,45 @@
+import numpy as np
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 from src.features.calendar import easter_dates, easter_monday_dates
+from src.instrumentation import instrument
+from src.data.make_dataset import SERIES_KEYS, SERIES_ATTRIBUTES
 
+@instrument('fill_time_series')
 def fill_time_series(
     raw_data_df: pd.DataFrame
     ) -> pd.DataFrame:
     """Fills data for missing dates in raw dataframe per item. 
     Dataframe must have daily DatetimeIndex.
     """
-    data_df = raw_data_df.resample('D').sum()
+    # Series keys (bar and item name) and item attributes are constant per series, they are not summed
+    key_columns = [col for col in SERIES_KEYS + SERIES_ATTRIBUTES if col in raw_data_df.columns]
+    data_df = raw_data_df.drop(columns=key_columns).resample('D').sum()
+    for col in key_columns:
+        data_df.loc[:, col] = raw_data_df[col].iloc[0]
     data_df.loc[:, 'item_price'] = data_df.item_price.replace(to_replace=0, method='ffill')
     return data_df
 
 
+@instrument('fill_series')
+def fill_series(
+    data_df: pd.DataFrame,
+    keys: list = SERIES_KEYS
+    ) -> pd.DataFrame:
+    """Fills missing dates of every series (bar and item) in daily sales dataframe.
+    Dataframe must have daily DatetimeIndex named 'sales_date'.
+    """
+    return data_df.groupby(keys).apply(fill_time_series).drop(columns=keys).reset_index().set_index('sales_date')
+
+
 class MetadataTransformer(BaseEstimator, TransformerMixin):
     def __init__(self, columns_to_drop=None):
         self.columns_to_drop = columns_to_drop
+    @instrument()
     def fit(self, X, y=None):
         self.columns_to_drop = ['sales_value']
         return self
+    @instrument()
     def transform(self, X, y=None):
         X_ = X.copy()
         columns_to_keep = [col for col in X_.columns if col not in self.columns_to_drop]
@@ -29,10 +50,12 @@ class CalendarTransformer(BaseEstimator, TransformerMixin):
     def __init__(self, add_daysofweek=True):
         self.add_daysofweek = add_daysofweek
 
+    @instrument()
     def fit(self, X, y=None):
         self.min_year = X.index.year.min()
         return self
 
+    @instrument()
     def transform(self, X, y=None):
         X_ = X.copy() # creating a copy to avoid changes to original dataset
         #X_.loc[:,'day_of_week'] = X_.index.day_of_week
@@ -60,9 +83,11 @@ class HolidaysTransformer(BaseEstimator, TransformerMixin):
     def __init__(self, feature_names=None):
         self.feature_names = feature_names
 
+    @instrument()
     def fit(self, X, y=None):
         return self
 
+    @instrument()
     def transform(self, X, y=None):
         X_ = X.copy() # creating a copy to avoid changes to original dataset
         X_.loc[:, 'easter'] = X_.index.isin(easter_dates).astype('int8')
@@ -81,6 +106,95 @@ class HolidaysTransformer(BaseEstimator, TransformerMixin):
 
 
 
+# (shift in days, centered rolling window in days) of lagged sales means from model training notebook
+LAGGED_SALES = [(358, 14), (351, 14), (372, 14), (379, 14), (365, 14), (35, 7), (60, 7), (60, 14), (90, 7), (90, 14)]
+# Fixed date holidays (month, day) with days to / days since features
+HOLIDAY_DATES = {'sv_lovre': (8, 10), 'new_years_day': (1, 1), 'christmas': (12, 25)}
+
+
+class LaggedSalesTransformer(BaseEstimator, TransformerMixin):
+    """Adds lagged_sales_{shift}d_{window}d_mean features: centered rolling mean of sales
+    shifted by shift days, computed per series (bar and item) so windows do not cross series.
+    Dataframe must be filled daily per series (see fill_series).
+    """
+
+    def __init__(self, lags=LAGGED_SALES, target='sales_qty'):
+        self.lags = lags
+        self.target = target
+
+    @instrument()
+    def fit(self, X, y=None):
+        return self
+
+    @instrument()
+    def transform(self, X, y=None):
+        X_ = X.copy()
+        keys = [col for col in SERIES_KEYS if col in X_.columns]
+        sales = X_.groupby(keys, sort=False)[self.target]
+        for shift, window in self.lags:
+            X_.loc[:, f'lagged_sales_{shift}d_{window}d_mean'] = sales.transform(
+                lambda series: series.shift(shift).rolling(window, center=True).mean())
+        return X_
+
+
+class WeekdayAveragesTransformer(BaseEstimator, TransformerMixin):
+    """Adds avg_weekday_1m (average sales of the same weekday in previous month) and
+    avg_weekday_yearly (average sales of the same weekday in previous year) per series.
+    """
+
+    def __init__(self, target='sales_qty'):
+        self.target = target
+
+    @instrument()
+    def fit(self, X, y=None):
+        return self
+
+    @instrument()
+    def transform(self, X, y=None):
+        X_ = X.copy()
+        keys = [col for col in SERIES_KEYS if col in X_.columns]
+        periods = pd.DataFrame({'year': X_.index.year, 'month': X_.index.month,
+                                'weekday': X_.index.day_of_week}, index=X_.index)
+        data_df = pd.concat([X_[keys + [self.target]], periods], axis=1)
+        for feature, period in (('avg_weekday_1m', ['year', 'month']), ('avg_weekday_yearly', ['year'])):
+            averages = data_df.groupby(keys + period + ['weekday'])[self.target].mean()
+            # Averages of previous period of the same weekday, so there is no target leakage
+            averages = averages.groupby(keys + ['weekday']).shift(1).rename(feature)
+            X_.loc[:, feature] = data_df.join(averages, on=keys + period + ['weekday'])[feature].values
+        return X_
+
+
+class HolidayDistanceTransformer(BaseEstimator, TransformerMixin):
+    """Adds days_to_{holiday}_{days} and days_since_{holiday}_{days}: number of days to
+    (since) the nearest holiday when it is at most days away, else 0.
+    """
+
+    def __init__(self, holidays=HOLIDAY_DATES, days=7):
+        self.holidays = holidays
+        self.days = days
+
+    @instrument()
+    def fit(self, X, y=None):
+        return self
+
+    @instrument()
+    def transform(self, X, y=None):
+        X_ = X.copy()
+        dates = X_.index.normalize()
+        if dates.tz is not None:
+            dates = dates.tz_localize(None)
+        for holiday, (month, day) in self.holidays.items():
+            # Signed distance to holiday of previous, same and next year, nearest one is used
+            distances = np.stack([
+                (pd.to_datetime(pd.DataFrame({'year': dates.year + offset, 'month': month, 'day': day})).values
+                 - dates.values).astype('timedelta64[D]').astype(int)
+                for offset in (-1, 0, 1)])
+            nearest = distances[np.abs(distances).argmin(axis=0), np.arange(len(dates))]
+            X_.loc[:, f'days_to_{holiday}_{self.days}'] = np.where((nearest > 0) & (nearest <= self.days), nearest, 0)
+            X_.loc[:, f'days_since_{holiday}_{self.days}'] = np.where((nearest < 0) & (nearest >= -self.days), -nearest, 0)
+        return X_
+
+
 def add_calendar_features(
     raw_data_df: pd.DataFrame
     ) -> pd.DataFrame:
@@ -0,0 +1,266 @@
+"""Lightweight stage instrumentation for the pipeline.
+
+Every instrumented stage records wall time, CPU time, rows in and out and peak
+traced memory. Records are written as JSON lines or in Chrome trace format
+(open in chrome://tracing or https://ui.perfetto.dev). Instrumentation is off by
+default, disabled stages cost one attribute lookup.
+
+Enable it in code:
+
+    from src import instrumentation
+    instrumentation.configure(output='stages.jsonl')
+
+or with environment variables before the process starts:
+
+    CAFFE_BAR_TRACE=stages.json CAFFE_BAR_TRACE_FORMAT=chrome streamlit run ...
+    CAFFE_BAR_PROFILE=load_dataset,arrange_data (cProfile dumps per stage)
+"""
+import os
+import json
+import time
+import atexit
+import cProfile
+import functools
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+FORMATS = ('jsonl', 'chrome')
+
+
+class _Config:
+    enabled = False
+    output = None
+    format = 'jsonl'
+    trace_memory = True
+    profile_stages = frozenset()
+    profile_dir = '.'
+
+
+_config = _Config()
+_local = threading.local()
+_lock = threading.Lock()
+_sink = None
+_profile_counts = {}
+# Last records kept in memory for inspection, bounded for long running processes
+_collected = deque(maxlen=10000)
+
+
+class StageRecord:
+    """Measurements of a single stage run, rows_out can be set inside the with block."""
+
+    __slots__ = ('stage', 'rows_in', 'rows_out', 'start', 'wall_s', 'cpu_s', 'peak_mb', 'parent', 'max_seen_peak')
+
+    def __init__(self, stage, rows_in=None, parent=None):
+        self.stage = stage
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.parent = parent
+        self.start = None
+        self.wall_s = None
+        self.cpu_s = None
+        self.peak_mb = None
+        self.max_seen_peak = 0
+
+    def to_dict(self):
+        return {
+            'stage': self.stage,
+            'parent': self.parent,
+            'start': self.start,
+            'wall_s': self.wall_s,
+            'cpu_s': self.cpu_s,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'peak_mb': self.peak_mb,
+            'pid': os.getpid(),
+            'thread': threading.get_ident()
+        }
+
+
+def configure(output=None, format='jsonl', enabled=True, trace_memory=True,
+              profile_stages=None, profile_dir='.'):
+    """Enable (or disable) instrumentation.
+
+    Parameters:
+    -----------
+    output: path of records file, records are collected only in memory if None
+    format: 'jsonl' (one record per line) or 'chrome' (Chrome trace event format)
+    enabled: turn instrumentation on or off
+    trace_memory: measure peak memory per stage with tracemalloc (slows allocations)
+    profile_stages: names of stages to run under cProfile, '*' for all stages
+    profile_dir: folder for cProfile dumps ({stage}_{run}.prof)
+    """
+    global _sink
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format '{format}', expected one of {FORMATS}")
+    with _lock:
+        if _sink is not None:
+            _sink.close()
+            _sink = None
+        _config.enabled = enabled
+        _config.output = output
+        _config.format = format
+        _config.trace_memory = trace_memory
+        _config.profile_stages = frozenset(profile_stages or ())
+        _config.profile_dir = profile_dir
+        _collected.clear()
+        if enabled and output is not None:
+            _sink = open(output, 'w')
+            if format == 'chrome':
+                # Closing bracket is optional in Chrome trace format, so events can be streamed
+                _sink.write('[\n')
+    if enabled and trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def is_enabled():
+    return _config.enabled
+
+
+def records():
+    """Last records collected in this process (since last configure) as dictionaries."""
+    return list(_collected)
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _emit(record):
+    record_dict = record.to_dict()
+    with _lock:
+        _collected.append(record_dict)
+        if _sink is None:
+            return
+        if _config.format == 'chrome':
+            event = {
+                'name': record.stage,
+                'cat': 'stage',
+                'ph': 'X',
+                'ts': record.start * 1e6,
+                'dur': record.wall_s * 1e6,
+                'pid': record_dict['pid'],
+                'tid': record_dict['thread'],
+                'args': {key: record_dict[key] for key in ('cpu_s', 'rows_in', 'rows_out', 'peak_mb')}
+            }
+            _sink.write(json.dumps(event) + ',\n')
+        else:
+            _sink.write(json.dumps(record_dict) + '\n')
+        _sink.flush()
+
+
+def _profile_path(stage_name):
+    with _lock:
+        run = _profile_counts.get(stage_name, 0)
+        _profile_counts[stage_name] = run + 1
+    return os.path.join(_config.profile_dir, f'{stage_name}_{run}.prof')
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """Context manager measuring a pipeline stage.
+
+        with stage('read_csv', rows_in=None) as record:
+            df = pd.read_csv(...)
+            record.rows_out = len(df)
+    """
+    if not _config.enabled:
+        yield StageRecord(name, rows_in)
+        return
+    stack = _stack()
+    record = StageRecord(name, rows_in, parent=stack[-1].stage if stack else None)
+    trace_memory = _config.trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        # Tracing can be stopped by other code (eg. memory measurement of benchmarks), it is checked per stage
+        tracemalloc.start()
+    if trace_memory:
+        start_memory, peak_so_far = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1].max_seen_peak = max(stack[-1].max_seen_peak, peak_so_far)
+        tracemalloc.reset_peak()
+    profiler = None
+    # Only one cProfile profiler can be active, nested stages are part of the outer profile
+    if ((name in _config.profile_stages or '*' in _config.profile_stages)
+            and not getattr(_local, 'profiling', False)):
+        profiler = cProfile.Profile()
+        _local.profiling = True
+    stack.append(record)
+    record.start = time.time()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _local.profiling = False
+        record.wall_s = time.perf_counter() - start_wall
+        record.cpu_s = time.process_time() - start_cpu
+        stack.pop()
+        if trace_memory:
+            peak = max(record.max_seen_peak, tracemalloc.get_traced_memory()[1])
+            record.peak_mb = round((peak - start_memory) / 2**20, 3)
+            # Peaks of nested stages are lost on reset_peak of their children, pass them to parent
+            if stack:
+                stack[-1].max_seen_peak = max(stack[-1].max_seen_peak, peak)
+        if profiler is not None:
+            profiler.dump_stats(_profile_path(name))
+        _emit(record)
+
+
+def _count_rows(obj):
+    shape = getattr(obj, 'shape', None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+def instrument(name=None, rows_out=None):
+    """Decorator measuring every call of the function as a stage.
+
+    Parameters:
+    -----------
+    name: stage name, defaults to function qualified name
+    rows_out: function computing output rows from return value, defaults to
+              number of rows of returned dataframe/array
+    """
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _config.enabled:
+                return func(*args, **kwargs)
+            rows_in = next((rows for rows in map(_count_rows, args) if rows is not None), None)
+            with stage(stage_name, rows_in) as record:
+                result = func(*args, **kwargs)
+                record.rows_out = rows_out(result) if rows_out is not None else _count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def _close_sink():
+    with _lock:
+        if _sink is not None:
+            _sink.close()
+
+
+def _configure_from_env():
+    output = os.environ.get('CAFFE_BAR_TRACE')
+    profile_stages = [name for name in os.environ.get('CAFFE_BAR_PROFILE', '').split(',') if name]
+    if output or profile_stages:
+        configure(output=output,
+                  format=os.environ.get('CAFFE_BAR_TRACE_FORMAT', 'jsonl'),
+                  trace_memory=os.environ.get('CAFFE_BAR_TRACE_MEMORY', '1') != '0',
+                  profile_stages=profile_stages,
+                  profile_dir=os.environ.get('CAFFE_BAR_PROFILE_DIR', '.'))
+
+
+atexit.register(_close_sink)
+_configure_from_env()
@@ -0,0 +1,159 @@
+"""Rolling-origin backtest: forecast cutoff is moved forward step by step and the booster
+is scored on the horizon after every cutoff.
+
+Full retrain at every cutoff is expensive, so cutoffs are split into segments of
+retrain_every cutoffs. First cutoff of a segment trains a booster from scratch on all
+rows before the cutoff, following cutoffs continue boosting from the previous booster
+(xgb_model) on only the rows added since the previous cutoff. Segments are independent
+and run in parallel worker processes.
+
+Usage (from project root), features of registered model are used as predictors:
+    python -m src.models.backtest --dataset data/processed/dataset_with_predictions.pkl --start 2019-01-01 \
+        --model-key caffe_bar_demand_forecast
+"""
+import argparse
+import pandas as pd
+from src.data.make_dataset import SERIES_KEYS
+from src.data.sharding import run_sharded
+from src.models.train_model import train_booster, PARAMS
+from src.models.predict_model import predict
+from src.models.registry import ModelRegistry, REGISTRY_PATH
+from src.evaluation.scoring import errors_per_group
+from src.instrumentation import instrument
+
+# Learning rate of warm start rounds, lower than PARAMS eta (see backtest)
+WARM_START_ETA = 0.1
+
+
+def make_cutoffs(dates: pd.DatetimeIndex, start: str, step: str = '7D', end: str = None) -> list:
+    """Cutoff dates from start to end (last date of dates if None) every step.
+    Cutoff is the first forecasted date, training data ends one day before it.
+    """
+    end = pd.Timestamp(end) if end is not None else dates.max().tz_localize(None)
+    return list(pd.date_range(start, end, freq=step))
+
+
+def backtest_segment(cutoffs: tuple,
+                     data_df: pd.DataFrame,
+                     predictors: list,
+                     horizon: int,
+                     params: dict,
+                     num_boost_round: int,
+                     warm_start_rounds: int,
+                     warm_start_params: dict) -> pd.DataFrame:
+    """Backtest consecutive cutoffs, full retrain at the first cutoff and warm start after it.
+
+    Returns:
+    --------
+    predictions_df: horizon rows of every cutoff with 'cutoff', 'retrained' and 'prediction' columns
+    """
+    booster, previous_cutoff, results = None, None, []
+    for cutoff in cutoffs:
+        if booster is None:
+            booster = train_booster(data_df[data_df.index < cutoff], predictors,
+                                    params=params, num_boost_round=num_boost_round)
+        else:
+            new_rows = data_df[(data_df.index >= previous_cutoff) & (data_df.index < cutoff)]
+            if len(new_rows):
+                booster = train_booster(new_rows, predictors, params=warm_start_params,
+                                        num_boost_round=warm_start_rounds, xgb_model=booster)
+        horizon_df = data_df[(data_df.index >= cutoff) & (data_df.index < cutoff + pd.Timedelta(days=horizon))]
+        if len(horizon_df):
+            results.append(predict(booster, horizon_df).assign(cutoff=cutoff, retrained=previous_cutoff is None))
+        previous_cutoff = cutoff
+    return pd.concat(results) if results else pd.DataFrame()
+
+
+@instrument('backtest', rows_out=len)
+def backtest(data_df: pd.DataFrame,
+             cutoffs: list,
+             horizon: int = 7,
+             retrain_every: int = 4,
+             predictors: list = None,
+             params: dict = PARAMS,
+             num_boost_round: int = 100,
+             warm_start_rounds: int = 10,
+             warm_start_params: dict = None,
+             n_workers: int = None) -> pd.DataFrame:
+    """Rolling-origin backtest of Poisson booster.
+
+    Parameters:
+    -----------
+    data_df: daily dataset with features, DatetimeIndex, series keys and target
+    cutoffs: forecast cutoff dates, see make_cutoffs
+    horizon: number of forecasted days after every cutoff
+    retrain_every: full retrain every retrain_every cutoffs, warm start in between
+                   (1 - full retrain at every cutoff, None - only at the first cutoff)
+    predictors: feature columns (eg. feature_names of registered model), required because
+                other columns of saved datasets (errors, predictions) would leak target
+    params: xgboost parameters
+    num_boost_round: boosting rounds of full retrain
+    warm_start_rounds: boosting rounds added on new rows at every warm started cutoff
+    warm_start_params: xgboost parameters of warm start rounds, params with eta WARM_START_ETA
+                       if None; new rows are only days since previous cutoff, with full
+                       retrain eta the trees overfit them and warm started cutoffs are worse
+                       than full retrain (lower eta keeps them closer, but changes less)
+    n_workers: number of worker processes for independent segments, 1 runs serially
+
+    Returns:
+    --------
+    metrics_df: errors per cutoff and series with columns cutoff, retrained, series keys,
+                sales_qty, prediction, wmape and wbias
+    """
+    if not predictors:
+        raise ValueError('Backtest needs explicit list of predictors, eg. feature names of registered model')
+    missing_predictors = [predictor for predictor in predictors if predictor not in data_df.columns]
+    if missing_predictors:
+        raise ValueError(f'Predictors are missing in dataset: {missing_predictors}')
+    if not len(cutoffs):
+        raise ValueError('Backtest needs at least one cutoff date')
+    cutoffs = pd.DatetimeIndex(cutoffs).sort_values()
+    if cutoffs.tz is None and data_df.index.tz is not None:
+        cutoffs = cutoffs.tz_localize(data_df.index.tz)
+    cutoffs = list(cutoffs)
+    if cutoffs[0] <= data_df.index.min():
+        raise ValueError(f'First cutoff {cutoffs[0]:%Y-%m-%d} leaves no training data before it')
+    retrain_every = retrain_every or len(cutoffs)
+    segments = [tuple(cutoffs[i:i + retrain_every]) for i in range(0, len(cutoffs), retrain_every)]
+    # Worker of a segment gets only rows up to its last horizon (slices of sorted data are not copied)
+    data_df = data_df.sort_index(kind='stable')
+    segment_data = {segment: {'data_df': data_df.iloc[:data_df.index.searchsorted(segment[-1] + pd.Timedelta(days=horizon))]}
+                    for segment in segments}
+    results = run_sharded(backtest_segment, segments, n_workers, shard_kwargs=segment_data, predictors=predictors,
+                          horizon=horizon, params=params, num_boost_round=num_boost_round,
+                          warm_start_rounds=warm_start_rounds,
+                          warm_start_params=warm_start_params or {**params, 'eta': WARM_START_ETA})
+    results = [result for result in results.values() if len(result)]
+    if not results:
+        raise ValueError(f'No rows within {horizon} days after cutoffs {cutoffs[0]:%Y-%m-%d} - {cutoffs[-1]:%Y-%m-%d}')
+    predictions_df = pd.concat(results)
+    keys = [key for key in SERIES_KEYS if key in predictions_df.columns]
+    return errors_per_group(predictions_df, ['cutoff', 'retrained'] + keys).reset_index()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Rolling-origin backtest of daily sales booster.')
+    parser.add_argument('--dataset', required=True, help='pickled dataset with features')
+    parser.add_argument('--start', required=True, help='first cutoff date')
+    parser.add_argument('--end', default=None, help='last cutoff date')
+    parser.add_argument('--model-key', required=True, help='registered model whose features are used')
+    parser.add_argument('--model-version', default=None)
+    parser.add_argument('--registry', default=REGISTRY_PATH)
+    parser.add_argument('--step', default='7D')
+    parser.add_argument('--horizon', type=int, default=7)
+    parser.add_argument('--retrain-every', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='backtest_metrics.csv')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    dataset = pd.read_pickle(args.dataset)
+    registry = ModelRegistry(args.registry)
+    feature_names = (registry.metadata(args.model_key, args.model_version).get('feature_names')
+                     or registry.load(args.model_key, args.model_version).feature_names)
+    metrics_df = backtest(dataset, make_cutoffs(dataset.index, args.start, args.step, args.end),
+                          predictors=feature_names, horizon=args.horizon, retrain_every=args.retrain_every, n_workers=args.workers)
+    metrics_df.to_csv(args.output, index=False)
+    print(metrics_df.groupby('cutoff')[['wmape', 'wbias']].mean())
@@ -0,0 +1,163 @@
+"""Intermittent demand baselines for long-tail items: Croston, SBA, TSB and seasonal naive.
+
+Items that sell on only a few days a year are forecasted with simple baselines instead
+of the booster. All items are fitted at once on dense items x days matrix: smoothing
+recursions loop over days with numpy operations over all items, there is no loop over
+items. Method of every item is chosen by its WMAPE on rolling holdout windows.
+"""
+import numpy as np
+import pandas as pd
+from src.models.hierarchy import to_series_matrix
+from src.evaluation.scoring import wmape_rows
+from src.instrumentation import instrument
+
+METHODS = ['croston', 'sba', 'tsb', 'seasonal_naive']
+# Method of items when history is too short for holdout windows
+DEFAULT_METHOD = 'sba'
+
+
+def dense_items(data_df: pd.DataFrame, top_n: int = 40, min_sales_days_ratio: float = 0.5) -> pd.Index:
+    """Items for booster: top_n items by sales (as dataset_summary[:40] in notebooks) and
+    items sold on at least min_sales_days_ratio of days. Other items are long tail.
+    """
+    days = data_df.index.nunique()
+    summary = data_df[data_df['sales_qty'] > 0].groupby('item_name')['sales_qty'].agg(['sum', 'count'])
+    summary = summary.sort_values('sum', ascending=False)
+    dense = summary.index[:top_n].union(summary.index[summary['count'] >= min_sales_days_ratio * days])
+    return dense
+
+
+def fit_intermittent(Y: np.ndarray, alpha: float = 0.1, beta: float = 0.1) -> dict:
+    """One pass over days of items x days matrix, returns flat forecasts per item.
+
+    Croston: demand size z and inter-demand interval p are smoothed with alpha on demand
+             days, forecast is z / p; SBA is Croston with bias correction (1 - alpha / 2).
+    TSB: demand size is smoothed with alpha on demand days, demand probability a with
+         beta on every day, forecast is a * z.
+
+    Returns:
+    --------
+    forecasts: dict of method -> forecast per item (items,)
+    """
+    n_items, n_days = Y.shape
+    demand = Y > 0
+    nonzero_count = demand.sum(axis=1)
+    # TSB starts from average demand probability and size, Croston from the first demand
+    z_tsb = np.divide(Y.sum(axis=1), nonzero_count, out=np.zeros(n_items), where=nonzero_count > 0)
+    a = nonzero_count / max(n_days, 1)
+    z, p = np.zeros(n_items), np.ones(n_items)
+    q = np.zeros(n_items)
+    started = np.zeros(n_items, dtype=bool)
+    for t in range(n_days):
+        y, d = Y[:, t], demand[:, t]
+        q += 1
+        first = d & ~started
+        update = d & started
+        z[first], p[first] = y[first], q[first]
+        z[update] += alpha * (y[update] - z[update])
+        p[update] += alpha * (q[update] - p[update])
+        z_tsb[d] += alpha * (y[d] - z_tsb[d])
+        a += beta * (d - a)
+        started |= d
+        q[d] = 0
+    croston = np.where(started, z / p, 0.0)
+    return {
+        'croston': croston,
+        'sba': (1 - alpha / 2) * croston,
+        'tsb': a * z_tsb
+    }
+
+
+def seasonal_naive(Y: np.ndarray, horizon: int, season_length: int = 7) -> np.ndarray:
+    """Repeat last season of every item (items x horizon). With less than one season
+    of history, average of available days is repeated.
+    """
+    if Y.shape[1] < season_length:
+        average = Y.mean(axis=1) if Y.shape[1] else np.zeros(Y.shape[0])
+        return np.repeat(average[:, None], horizon, axis=1)
+    last_season = Y[:, -season_length:]
+    return last_season[:, np.arange(horizon) % season_length]
+
+
+def forecast_all(Y: np.ndarray, horizon: int, alpha: float = 0.1, beta: float = 0.1,
+                 season_length: int = 7) -> np.ndarray:
+    """Forecasts of all methods (methods x items x horizon), methods ordered as METHODS."""
+    flat = fit_intermittent(Y, alpha, beta)
+    forecasts = np.empty((len(METHODS), Y.shape[0], horizon))
+    for i, method in enumerate(METHODS[:-1]):
+        forecasts[i] = flat[method][:, None]
+    forecasts[-1] = seasonal_naive(Y, horizon, season_length)
+    return forecasts
+
+
+@instrument('select_baselines')
+def select_methods(Y: np.ndarray, horizon: int, n_origins: int = 4, **kwargs):
+    """Backtest all methods on n_origins consecutive holdout windows of horizon days at the
+    end of matrix and choose method with the lowest WMAPE per item. Origins with less than
+    one season of history are skipped; without any holdout window DEFAULT_METHOD is chosen
+    and scores are NaN.
+
+    Returns:
+    --------
+    method_codes: index into METHODS per item
+    scores: WMAPE (methods x items) over all holdout windows
+    """
+    n_days = Y.shape[1]
+    season_length = kwargs.get('season_length', 7)
+    abs_errors = np.zeros((len(METHODS), Y.shape[0]))
+    actuals = np.zeros(Y.shape[0])
+    evaluated = False
+    for origin in range(n_days - n_origins * horizon, n_days, horizon):
+        if origin < season_length:
+            continue
+        holdout = Y[:, origin:origin + horizon]
+        forecasts = forecast_all(Y[:, :origin], horizon, **kwargs)[:, :, :holdout.shape[1]]
+        abs_errors += np.abs(forecasts - holdout[None]).sum(axis=2)
+        actuals += holdout.sum(axis=1)
+        evaluated = True
+    if not evaluated:
+        return np.full(Y.shape[0], METHODS.index(DEFAULT_METHOD)), np.full(abs_errors.shape, np.nan)
+    scores = wmape_rows(actuals[None], abs_errors)
+    return scores.argmin(axis=0), scores
+
+
+@instrument('forecast_baselines', rows_out=len)
+def forecast_baselines(data_df: pd.DataFrame,
+                       horizon: int = 28,
+                       items: pd.Index = None,
+                       n_origins: int = 4,
+                       start=None,
+                       end=None,
+                       **kwargs) -> pd.DataFrame:
+    """Forecast next horizon days of items with baseline chosen per item by backtest WMAPE.
+
+    Parameters:
+    -----------
+    data_df: daily sales with DatetimeIndex, 'item_name' and 'sales_qty'
+    horizon: number of forecasted days after last date of data_df
+    items: items to forecast, all items if None (eg. items not in dense_items)
+    n_origins: number of holdout windows for method selection
+    start, end: first and last date of history, first and last date of data_df if None;
+                pass dates of whole store data when data_df is a subset of items (eg. long
+                tail), so that days without sales at the edges are counted as zeros
+    kwargs: alpha, beta and season_length of baselines
+
+    Returns:
+    --------
+    forecasts_df: daily forecasts with DatetimeIndex, 'item_name', 'method', 'wmape' and 'prediction'
+    """
+    if items is None:
+        items = data_df['item_name'].unique()
+    items = pd.Index(items)
+    dates = pd.date_range(data_df.index.min() if start is None else start,
+                          data_df.index.max() if end is None else end, freq='D')
+    Y, _ = to_series_matrix(data_df, 'sales_qty', items, dates)
+    method_codes, scores = select_methods(Y, horizon, n_origins, **kwargs)
+    forecasts = forecast_all(Y, horizon, **kwargs)[method_codes, np.arange(len(items))]
+    future_dates = pd.date_range(dates[-1] + pd.Timedelta(days=1), periods=horizon, freq='D', name='sales_date')
+    return pd.DataFrame({
+        'item_name': np.repeat(items, horizon),
+        'method': np.repeat(np.array(METHODS)[method_codes], horizon),
+        'wmape': np.repeat(scores[method_codes, np.arange(len(items))], horizon),
+        'prediction': forecasts.ravel()
+    }, index=future_dates[np.tile(np.arange(horizon), len(items))])
@@ -0,0 +1,163 @@
+"""Compact array-backed tree ensemble for inference without xgboost.
+
+Trees of a trained booster are flattened into contiguous arrays over all nodes (split
+feature, threshold, children, default direction for missing values and leaf value) and
+saved with a small JSON header in a single file:
+
+    MAGIC | header length (uint64) | JSON header | arrays (each aligned to 64 bytes)
+
+Arrays are memory mapped on load, so many processes can share one file and only the
+header is parsed. Predictions move all rows through all trees at once, one tree level
+per step, and apply the link function of the objective (exp for 'count:poisson').
+
+It avoids importing xgboost and building DMatrix, which dominate latency of small
+batches; for large batches xgboost predictor is much faster (see COMPACT_MAX_ROWS in
+registry.py).
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+
+MAGIC = b'CBTREES2'
+COMPACT_EXTENSION = '.trees'
+ALIGNMENT = 64
+# Arrays in file order, children are (right, left) pairs so child is children[2 * node + go_left]
+ARRAYS = [('feature', '<i4', 1), ('threshold', '<f4', 1), ('children', '<i4', 2),
+          ('default_left', '?', 1), ('value', '<f4', 1)]
+LINKS = {
+    'count:poisson': (np.log, np.exp),
+    'reg:squarederror': (lambda score: score, lambda margin: margin),
+}
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def flatten_booster(booster) -> tuple:
+    """Flatten trees used by booster predictions (up to best_iteration if it is set).
+
+    Returns:
+    --------
+    arrays: dict of ARRAYS over nodes of all trees, children are global node indices
+    header: feature names, objective, base margin, tree roots and maximum depth
+    """
+    model = json.loads(booster.save_raw('json'))['learner']
+    objective = model['objective']['name']
+    if objective not in LINKS:
+        raise ValueError(f"Objective '{objective}' is not supported, expected one of {list(LINKS)}")
+    gbtree = model['gradient_booster']['model']
+    trees = gbtree['trees']
+    if booster.attr('best_iteration') is not None:
+        trees = trees[:(int(booster.attr('best_iteration')) + 1) * int(gbtree['gbtree_model_param']['num_parallel_tree'])]
+
+    n_nodes = sum(len(tree['left_children']) for tree in trees)
+    arrays = {name: np.zeros(n_nodes * width, dtype=dtype) for name, dtype, width in ARRAYS}
+    children = arrays['children'].reshape(n_nodes, 2)
+    roots, offset, max_depth = [], 0, 0
+    for tree in trees:
+        if any(tree['split_type']):
+            raise ValueError('Categorical splits are not supported')
+        left, right = np.array(tree['left_children']), np.array(tree['right_children'])
+        leaf = left == -1
+        nodes = slice(offset, offset + len(left))
+        arrays['feature'][nodes] = tree['split_indices']
+        arrays['threshold'][nodes] = np.where(leaf, 0.0, tree['split_conditions'])
+        # Leaves point to themselves, so rows stay in leaf until all trees are traversed
+        children[nodes, 0] = np.where(leaf, np.arange(len(left)), right) + offset
+        children[nodes, 1] = np.where(leaf, np.arange(len(left)), left) + offset
+        arrays['default_left'][nodes] = tree['default_left']
+        arrays['value'][nodes] = np.where(leaf, tree['split_conditions'], 0.0)
+        max_depth = max(max_depth, _tree_depth(left, right))
+        roots.append(offset)
+        offset += len(left)
+
+    feature_names = booster.feature_names
+    if feature_names is None and booster.attr('feature_names') is not None:
+        feature_names = booster.attr('feature_names').split('|')
+    base_score = float(model['learner_model_param']['base_score'])
+    header = {
+        'feature_names': feature_names,
+        'objective': objective,
+        'base_margin': float(LINKS[objective][0](base_score)),
+        'roots': roots,
+        'max_depth': max_depth,
+        'n_nodes': n_nodes,
+    }
+    return arrays, header
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth, level = 0, np.array([0])
+    while True:
+        level = level[left[level] != -1]
+        if not len(level):
+            return depth
+        level = np.concatenate([left[level], right[level]])
+        depth += 1
+
+
+def export_booster(booster, path: str) -> str:
+    """Save booster as compact tree ensemble file, returns path."""
+    arrays, header = flatten_booster(booster)
+    header_bytes = json.dumps(header).encode('utf-8')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for name, _, _ in ARRAYS:
+            f.write(b'\0' * (_aligned(f.tell()) - f.tell()))
+            f.write(arrays[name].tobytes())
+    return path
+
+
+class CompactTrees:
+    """Tree ensemble loaded from compact file, arrays are memory mapped (read only).
+
+    Parameters:
+    -----------
+    path: file saved by export_booster
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not a compact tree ensemble file')
+            header_length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(header_length))
+        self.path = path
+        self.feature_names = header['feature_names']
+        self.objective = header['objective']
+        self.base_margin = header['base_margin']
+        self.max_depth = header['max_depth']
+        self.roots = np.array(header['roots'], dtype=np.int64)
+        offset = len(MAGIC) + 8 + header_length
+        for name, dtype, width in ARRAYS:
+            offset = _aligned(offset)
+            array = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(header['n_nodes'] * width,))
+            setattr(self, name, array)
+            offset += array.nbytes
+
+    def predict_margin(self, X: np.ndarray, batch_size: int = 16384) -> np.ndarray:
+        """Sum of leaf values and base margin per row of X (rows x features)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        margin = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), batch_size):
+            batch = X[start:start + batch_size]
+            # Values are gathered from flat batch, row offsets are added to feature indices
+            values, row_offsets = batch.ravel(), np.arange(len(batch), dtype=np.int64)[:, None] * X.shape[1]
+            position = np.broadcast_to(self.roots, (len(batch), len(self.roots)))
+            for _ in range(self.max_depth):
+                x = values[row_offsets + self.feature[position]]
+                go_left = (x < self.threshold[position]) | (np.isnan(x) & self.default_left[position])
+                position = self.children[2 * position + go_left]
+            margin[start:start + batch_size] = self.value[position].sum(axis=1, dtype=np.float64)
+        return margin + self.base_margin
+
+    def predict(self, data) -> np.ndarray:
+        """Predictions for dataframe (columns by feature names) or array (rows x features)."""
+        if isinstance(data, pd.DataFrame):
+            data = data[self.feature_names].to_numpy(dtype=np.float32)
+        return LINKS[self.objective][1](self.predict_margin(data))
@@ -0,0 +1,168 @@
+"""Hierarchical forecasts: total -> item class -> item.
+
+Hierarchy is represented with sparse summing matrix S (nodes x items) whose rows are
+total, item classes and items (identity). Forecasts are matrices (nodes x dates), so
+aggregation and reconciliation of all dates is done with a few sparse matrix products.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from src.instrumentation import instrument
+
+TOTAL = 'Total'
+UNKNOWN_CLASS = 'Unknown'
+LEVELS = ['total', 'item_class', 'item_name']
+METHODS = ['bottom_up', 'top_down', 'ols', 'wls_struct', 'wls_var']
+
+
+@instrument('build_hierarchy')
+def build_hierarchy(item_classes: pd.Series):
+    """Build summing matrix from item classes.
+
+    Parameters:
+    -----------
+    item_classes: item class per item, indexed by item name, missing classes are UNKNOWN_CLASS
+
+    Returns:
+    --------
+    S: sparse summing matrix (nodes x items), rows are total, classes and items
+    nodes: dataframe with 'level' and 'name' of every row of S
+    """
+    # Missing class would get factorize code -1 and item would be summed in total row twice
+    item_classes = item_classes.fillna(UNKNOWN_CLASS)
+    items = item_classes.index
+    class_codes, classes = pd.factorize(item_classes, sort=True)
+    n_items, n_classes = len(items), len(classes)
+    item_codes = np.arange(n_items)
+    total_rows = np.zeros(n_items, dtype=int)
+    class_rows = 1 + class_codes
+    item_rows = 1 + n_classes + item_codes
+    S = sparse.csr_matrix(
+        (np.ones(3 * n_items), (np.concatenate([total_rows, class_rows, item_rows]), np.tile(item_codes, 3))),
+        shape=(1 + n_classes + n_items, n_items))
+    nodes = pd.DataFrame({
+        'level': ['total'] + ['item_class'] * n_classes + ['item_name'] * n_items,
+        'name': [TOTAL] + list(classes) + list(items)
+    })
+    return S, nodes
+
+
+def to_series_matrix(data_df: pd.DataFrame, value_column: str, items: pd.Index, dates: pd.DatetimeIndex = None):
+    """Pivot long daily dataframe (DatetimeIndex, 'item_name', value_column) to dense
+    items x dates matrix ordered as items. Missing item-days are 0.
+
+    Returns:
+    --------
+    matrix: numpy array (items x dates)
+    dates: dates of matrix columns
+    """
+    if dates is None:
+        dates = data_df.index.unique().sort_values()
+    item_codes = items.get_indexer(data_df['item_name'])
+    date_codes = dates.get_indexer(data_df.index)
+    valid = (item_codes >= 0) & (date_codes >= 0)
+    matrix = np.zeros((len(items), len(dates)))
+    np.add.at(matrix, (item_codes[valid], date_codes[valid]), data_df[value_column].values[valid])
+    return matrix, dates
+
+
+def aggregate(S: sparse.csr_matrix, bottom_matrix: np.ndarray) -> np.ndarray:
+    """Values of all nodes (nodes x dates) from item values (items x dates)."""
+    return np.asarray(S @ bottom_matrix)
+
+
+def _mint_precisions(S, method, residuals):
+    # Diagonal of W^-1 in MinT: (S'W^-1S)^-1 S'W^-1
+    if method == 'ols':
+        return np.ones(S.shape[0])
+    if method == 'wls_struct':
+        return 1.0 / np.asarray(S.sum(axis=1)).ravel()
+    if residuals is None:
+        raise ValueError("Method 'wls_var' needs in-sample residuals of all nodes")
+    variances = np.var(residuals, axis=1)
+    return 1.0 / np.maximum(variances, 1e-8)
+
+
+def _mint_bottom(S, base_forecasts, precisions):
+    """Reconciled item forecasts (S'W^-1S)^-1 S'W^-1 y with diagonal W.
+    S = [A; I] so S'W^-1S = D + A'CA with diagonal D (items) and C (aggregates) which is
+    inverted with Woodbury identity, only (aggregates x aggregates) matrix is dense.
+    """
+    n_items = S.shape[1]
+    A = S[:-n_items]
+    aggregate_precisions, item_precisions = precisions[:-n_items], precisions[-n_items:]
+    rhs = A.T @ (aggregate_precisions[:, None] * base_forecasts[:-n_items]) + item_precisions[:, None] * base_forecasts[-n_items:]
+    x = rhs / item_precisions[:, None]
+    small = np.diag(1.0 / aggregate_precisions) + (A @ sparse.diags(1.0 / item_precisions) @ A.T).toarray()
+    correction = A.T @ np.linalg.solve(small, A @ x)
+    return x - correction / item_precisions[:, None]
+
+
+@instrument('reconcile')
+def reconcile(base_forecasts: np.ndarray,
+              S: sparse.csr_matrix,
+              method: str = 'bottom_up',
+              actuals: np.ndarray = None,
+              residuals: np.ndarray = None) -> np.ndarray:
+    """Reconcile base forecasts of all nodes so that items sum up to classes and total.
+
+    Parameters:
+    -----------
+    base_forecasts: forecasts of all nodes (nodes x dates), rows ordered as in S
+    S: summing matrix from build_hierarchy
+    method: 'bottom_up' - sums of item forecasts,
+            'top_down' - total forecast split by historical item proportions (needs actuals),
+            'ols', 'wls_struct', 'wls_var' - MinT with identity, structural or
+            residual variance diagonal covariance ('wls_var' needs residuals)
+    actuals: historical item values (items x dates) for 'top_down'
+    residuals: in-sample residuals of all nodes (nodes x dates) for 'wls_var'
+
+    Returns:
+    --------
+    reconciled: coherent forecasts of all nodes (nodes x dates)
+    """
+    n_items = S.shape[1]
+    if method == 'bottom_up':
+        bottom = base_forecasts[-n_items:]
+    elif method == 'top_down':
+        if actuals is None:
+            raise ValueError("Method 'top_down' needs historical item actuals")
+        proportions = actuals.sum(axis=1) / max(actuals.sum(), 1e-8)
+        bottom = proportions[:, None] * base_forecasts[0][None, :]
+    elif method in METHODS:
+        bottom = _mint_bottom(S, base_forecasts, _mint_precisions(S, method, residuals))
+    else:
+        raise ValueError(f"Unknown method '{method}', expected one of {METHODS}")
+    return aggregate(S, bottom)
+
+
+@instrument('hierarchical_forecasts')
+def hierarchical_forecasts(predictions_df: pd.DataFrame,
+                           value_column: str = 'prediction',
+                           base_forecasts: np.ndarray = None,
+                           method: str = 'bottom_up',
+                           **kwargs) -> pd.DataFrame:
+    """Coherent forecasts of total, item classes and items for every date.
+
+    Parameters:
+    -----------
+    predictions_df: daily item predictions with DatetimeIndex, 'item_name' and 'item_class'
+    value_column: column with item forecasts
+    base_forecasts: forecasts of all nodes (nodes x dates), item forecasts are aggregated if None
+    method: reconciliation method, see reconcile
+    kwargs: actuals/residuals passed to reconcile
+
+    Returns:
+    --------
+    forecasts_df: dataframe (nodes x dates) with MultiIndex (level, name)
+    """
+    item_classes = predictions_df.groupby('item_name')['item_class'].first()
+    S, nodes = build_hierarchy(item_classes)
+    bottom_matrix, dates = to_series_matrix(predictions_df, value_column, item_classes.index)
+    if predictions_df.empty:
+        # Without items (eg. empty selection) hierarchy has only total and there is nothing to reconcile
+        return pd.DataFrame(np.zeros((len(nodes), 0)), index=pd.MultiIndex.from_frame(nodes), columns=dates)
+    if base_forecasts is None:
+        base_forecasts = aggregate(S, bottom_matrix)
+    reconciled = reconcile(base_forecasts, S, method, **kwargs)
+    return pd.DataFrame(reconciled, index=pd.MultiIndex.from_frame(nodes), columns=dates)
@@ -0,0 +1,15 @@
+import xgboost
+import pandas as pd
+from src.instrumentation import instrument
+
+
+@instrument('predict')
+def predict(booster: xgboost.Booster, data_df: pd.DataFrame) -> pd.DataFrame:
+    """Add 'prediction' column with booster predictions of daily sales.
+    Booster feature names are used as predictors.
+    """
+    predictions_df = data_df.copy()
+    iteration_range = (0, booster.best_iteration + 1) if booster.attr('best_iteration') is not None else (0, 0)
+    predictions_df.loc[:, 'prediction'] = booster.predict(xgboost.DMatrix(data_df[booster.feature_names]),
+                                                          iteration_range=iteration_range)
+    return predictions_df
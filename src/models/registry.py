@@ -0,0 +1,229 @@
+"""Model registry: maps model keys (eg. bar, item class or A/B variant) and versions to
+saved boosters with metadata, and keeps recently used boosters in LRU cache.
+
+Registry is a JSON file:
+
+    {"models": {"<key>": {"<version>": {"path": ..., "feature_names": [...],
+                                        "training_window": [from, to], "metrics": {...},
+                                        "hot": false, "registered_at": ...,
+                                        "compact_path": ...}}}}
+
+Paths are relative to registry file folder. Optional compact_path is the same booster
+exported as compact trees file (see compact_trees.py); it is used by predict for
+batches of at most COMPACT_MAX_ROWS rows, where building DMatrix costs more than
+predicting. Larger batches are predicted with xgboost.
+"""
+import os
+import json
+import datetime
+import threading
+from collections import OrderedDict
+from src.utils import get_project_root
+from src.instrumentation import instrument
+from src.models.compact_trees import CompactTrees, COMPACT_EXTENSION
+
+MODELS_DIR = get_project_root() / 'models'
+REGISTRY_PATH = MODELS_DIR / 'registry.json'
+DEFAULT_MODEL_KEY = 'caffe_bar_demand_forecast'
+DEFAULT_MODEL_VERSION = 'v1'
+DEFAULT_MODEL_FILENAME = 'xgb_caffe_bar_demand_forecast_v1.bst'
+# Compact trees are faster up to ~100 rows from dataframe (200 trees of depth 5: 0.3 vs 1.3 ms
+# for 1 row, 1.5 vs 1.6 ms for 64 rows), xgboost is ~4x faster on large batches
+COMPACT_MAX_ROWS = 64
+
+
+def load_booster_file(booster_path: str):
+    """Load booster and restore feature names saved in 'feature_names' attribute.
+    Compact tree files (see compact_trees.py) are loaded without xgboost.
+    """
+    if str(booster_path).endswith(COMPACT_EXTENSION):
+        return CompactTrees(booster_path)
+    import xgboost  # imported on first load, so registry can be used without xgboost
+    booster = xgboost.Booster()
+    booster.load_model(booster_path)
+    if booster.attr('feature_names') is not None:
+        booster.feature_names = booster.attr('feature_names').split('|')
+    return booster
+
+
+class ModelRegistry:
+    """Registry of boosters with lazy loading and LRU eviction.
+
+    Parameters:
+    -----------
+    registry_path: path of registry JSON file, created on first register and re-read
+                   when it is changed by another registry (eg. pipeline run)
+    max_models: maximum number of boosters kept in memory
+    max_memory_mb: maximum (approximate) size of boosters kept in memory
+    """
+
+    def __init__(self, registry_path=REGISTRY_PATH, max_models=8, max_memory_mb=512):
+        self.registry_path = str(registry_path)
+        self.max_models = max_models
+        self.max_memory_mb = max_memory_mb
+        self._lock = threading.RLock()
+        self._cache = OrderedDict()
+        self._compact = {}
+        self._file_stamp = None
+        self._models = {}
+        self._refresh()
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.registry_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        # Registry file is re-read when it was changed (eg. by pipeline in another process)
+        with self._lock:
+            stamp = self._stamp()
+            if stamp is not None and stamp == self._file_stamp:
+                return
+            models = self._read()
+            # Cached boosters of changed or removed versions must not be served
+            for key, version in list(self._cache):
+                if models.get(key, {}).get(version) != self._models.get(key, {}).get(version):
+                    self._cache.pop((key, version))
+            self._compact.clear()
+            self._models, self._file_stamp = models, stamp
+
+    def _read(self):
+        if os.path.exists(self.registry_path):
+            with open(self.registry_path) as f:
+                return json.load(f)['models']
+        # Without registry file single model from models folder is registered, as before registry
+        default_path = os.path.join(os.path.dirname(self.registry_path), DEFAULT_MODEL_FILENAME)
+        if os.path.exists(default_path):
+            return {DEFAULT_MODEL_KEY: {DEFAULT_MODEL_VERSION: {'path': DEFAULT_MODEL_FILENAME, 'hot': True}}}
+        return {}
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.registry_path) or '.', exist_ok=True)
+        tmp_path = self.registry_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'models': self._models}, f, indent=2)
+        os.replace(tmp_path, self.registry_path)
+
+    def register(self, key, version, path, feature_names=None, training_window=None, metrics=None, hot=False,
+                 compact_path=None):
+        """Add (or replace) model version and save registry file."""
+        with self._lock:
+            # Versions registered by other writers since last read are kept
+            self._refresh()
+            registry_dir = os.path.dirname(os.path.abspath(self.registry_path))
+            if hot:
+                # Only the newest version of a key stays hot, older ones are loaded on demand
+                for metadata in self._models.get(key, {}).values():
+                    metadata['hot'] = False
+            self._models.setdefault(key, {})[version] = {
+                'path': os.path.relpath(os.path.abspath(path), registry_dir),
+                'feature_names': feature_names,
+                'training_window': training_window,
+                'metrics': metrics or {},
+                'hot': hot,
+                'registered_at': datetime.datetime.now().isoformat(timespec='seconds')
+            }
+            if compact_path is not None:
+                self._models[key][version]['compact_path'] = os.path.relpath(os.path.abspath(compact_path), registry_dir)
+            # Replaced version must not be served from cache
+            self._cache.pop((key, version), None)
+            self._compact.pop((key, version), None)
+            self._write()
+            self._file_stamp = self._stamp()
+
+    def keys(self):
+        self._refresh()
+        return sorted(self._models)
+
+    def versions(self, key):
+        self._refresh()
+        return sorted(self._models.get(key, {}))
+
+    def latest_version(self, key):
+        self._refresh()
+        versions = self._models.get(key, {})
+        return max(versions, key=lambda version: versions[version].get('registered_at') or '', default=None)
+
+    def metadata(self, key, version=None):
+        self._refresh()
+        version = version or self.latest_version(key)
+        try:
+            return self._models[key][version]
+        except KeyError:
+            raise KeyError(f"Model '{key}' version '{version}' is not registered") from None
+
+    def model_path(self, key, version=None):
+        path = self.metadata(key, version)['path']
+        return os.path.join(os.path.dirname(os.path.abspath(self.registry_path)), path)
+
+    def compact_model_path(self, key, version=None):
+        path = self.metadata(key, version).get('compact_path')
+        return path and os.path.join(os.path.dirname(os.path.abspath(self.registry_path)), path)
+
+    @instrument('registry_load')
+    def load(self, key, version=None):
+        """Booster of model version (latest if None), loaded on first use."""
+        self._refresh()
+        version = version or self.latest_version(key)
+        with self._lock:
+            if (key, version) in self._cache:
+                self._cache.move_to_end((key, version))
+                return self._cache[(key, version)][0]
+            path = self.model_path(key, version)
+            booster = load_booster_file(path)
+            self._cache[(key, version)] = (booster, os.path.getsize(path) / 2**20)
+            self._evict()
+            return booster
+
+    def load_compact(self, key, version=None):
+        """Compact trees of model version (latest if None), None if not exported."""
+        self._refresh()
+        version = version or self.latest_version(key)
+        with self._lock:
+            if (key, version) not in self._compact:
+                path = self.compact_model_path(key, version)
+                # Arrays are memory mapped, so compact trees are not counted in LRU cache
+                self._compact[(key, version)] = CompactTrees(path) if path else None
+            return self._compact[(key, version)]
+
+    @instrument('registry_predict')
+    def predict(self, data_df, key, version=None):
+        """Add 'prediction' column with predictions of model version (latest if None).
+        Compact trees are used for at most COMPACT_MAX_ROWS rows if exported, booster otherwise.
+        """
+        model = self.load_compact(key, version) if len(data_df) <= COMPACT_MAX_ROWS else None
+        if model is None:
+            model = self.load(key, version)
+        if isinstance(model, CompactTrees):
+            return data_df.assign(prediction=model.predict(data_df))
+        from src.models.predict_model import predict  # imports xgboost
+        return predict(model, data_df)
+
+    def _evict(self):
+        # Least recently used boosters are dropped until cache fits both limits, last loaded is kept
+        while len(self._cache) > 1 and (len(self._cache) > self.max_models
+                                        or self.cached_memory_mb() > self.max_memory_mb):
+            self._cache.popitem(last=False)
+
+    def cached(self):
+        return list(self._cache)
+
+    def cached_memory_mb(self):
+        return sum(size_mb for _, size_mb in self._cache.values())
+
+    def preload(self, models=None):
+        """Load hot set of models, (key, version) pairs or the latest version registered
+        with hot=True of every key.
+        """
+        self._refresh()
+        if models is None:
+            models = []
+            for key, versions in self._models.items():
+                hot_versions = [version for version, metadata in versions.items() if metadata.get('hot')]
+                if hot_versions:
+                    models.append((key, max(hot_versions, key=lambda version: versions[version].get('registered_at') or '')))
+        for key, version in models[:self.max_models]:
+            self.load(key, version)
+        return self.cached()
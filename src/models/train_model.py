@@ -0,0 +1,72 @@
+import xgboost
+import pandas as pd
+from src.instrumentation import instrument
+from src.data.make_dataset import SERIES_KEYS, SERIES_ATTRIBUTES
+
+TARGET = 'sales_qty'
+PARAMS = {
+    'eta': 0.5,
+    'max_depth': 5,
+    'subsample': 0.9,
+    'colsample_bytree': 0.7,
+    'objective': 'count:poisson',
+    'booster': 'gbtree',
+    'tree_method': 'hist',
+}
+# Predictors of model training notebook
+HOLIDAYS = ['easter', 'easter_monday', 'christmas', 'new_years_day', 'new_years_eve', 'sv_lovre', 'prvi_maj',
+            'days_to_sv_lovre_7', 'days_since_sv_lovre_7', 'days_to_new_years_day_7', 'days_since_new_years_day_7',
+            'days_to_christmas_7', 'days_since_christmas_7']
+PREDICTORS = ['item_price', 'lagged_sales_358d_14d_mean', 'lagged_sales_372d_14d_mean', 'lagged_sales_60d_7d_mean',
+              'lagged_sales_35d_7d_mean', 'year', 'avg_weekday_1m', 'lagged_sales_351d_14d_mean',
+              'lagged_sales_379d_14d_mean', 'lagged_sales_60d_14d_mean', 'lagged_sales_90d_7d_mean',
+              'lagged_sales_90d_14d_mean', 'avg_weekday_yearly'] + HOLIDAYS
+NON_PREDICTORS = SERIES_KEYS + SERIES_ATTRIBUTES + [TARGET, 'sales_value', 'prediction']
+
+
+def get_predictors(data_df: pd.DataFrame) -> list:
+    """All feature columns of dataframe (everything except keys, target and outputs)."""
+    return [col for col in data_df.columns if col not in NON_PREDICTORS]
+
+
+@instrument('train_booster')
+def train_booster(train_df: pd.DataFrame,
+                  predictors: list = None,
+                  valid_df: pd.DataFrame = None,
+                  params: dict = PARAMS,
+                  num_boost_round: int = 200,
+                  early_stopping_rounds: int = 15,
+                  xgb_model: xgboost.Booster = None) -> xgboost.Booster:
+    """Train Poisson XGBoost booster on daily sales.
+
+    Parameters:
+    -----------
+    train_df: training dataframe with predictors and target
+    predictors: feature columns, all non-key columns are used if None
+    valid_df: validation dataframe for early stopping, optional
+    params: xgboost parameters
+    num_boost_round: maximum number of boosting rounds
+    early_stopping_rounds: used only with valid_df
+    xgb_model: booster to continue training from
+
+    Returns:
+    --------
+    booster: trained booster with 'feature_names' attribute set for saving
+    """
+    if predictors is None:
+        predictors = get_predictors(train_df)
+    dtrain = xgboost.DMatrix(train_df[predictors], train_df[TARGET])
+    evals = [(dtrain, 'train')]
+    if valid_df is not None:
+        evals.append((xgboost.DMatrix(valid_df[predictors], valid_df[TARGET]), 'valid'))
+    booster = xgboost.train(
+        params=params,
+        dtrain=dtrain,
+        evals=evals,
+        num_boost_round=num_boost_round,
+        early_stopping_rounds=early_stopping_rounds if valid_df is not None else None,
+        xgb_model=xgb_model,
+        verbose_eval=False)
+    # Feature names are not kept by save_model, they are restored from attribute in load_booster
+    booster.set_attr(feature_names='|'.join(booster.feature_names))
+    return booster
@@ -0,0 +1,206 @@
+"""Multi bar pipeline: raw files are split into one shard per bar (store) and every
+shard is loaded, filled, featurized, trained and scored in its own worker process.
+
+Usage (from project root), outputs are written to data/processed read by the dashboard:
+    python -m src.pipeline --data-dir data/raw
+"""
+import os
+import logging
+import argparse
+import pandas as pd
+from sklearn.pipeline import Pipeline
+from src.data.make_dataset import load_dataset, YEARS, RAW_DATA_DIR, PROCESSED_DATA_DIR
+from src.data.sharding import partition_raw_by_store, run_sharded, store_years, merge_store_results
+from src.data.inventory import simulate_inventory
+from src.features.build_features import (MetadataTransformer, CalendarTransformer, HolidaysTransformer,
+                                         HolidayDistanceTransformer, LaggedSalesTransformer,
+                                         WeekdayAveragesTransformer, fill_series)
+from src.models.train_model import train_booster, PREDICTORS
+from src.models.predict_model import predict
+from src.models.baselines import dense_items, forecast_baselines
+from src.models.compact_trees import export_booster, COMPACT_EXTENSION
+from src.models.registry import ModelRegistry, REGISTRY_PATH
+from src.evaluation.scoring import calculate_errors
+from src.instrumentation import instrument
+
+VALID_SPLIT_DATE = '2018-01-01'
+TEST_SPLIT_DATE = '2019-01-01'
+MODEL_FILENAME = 'xgb_caffe_bar_demand_forecast.bst'
+PREDICTIONS_FILENAME = 'dataset_with_predictions.pkl'
+INVENTORY_FILENAME = 'inventory_data_top40.pkl'
+BASELINE_FORECASTS_FILENAME = 'long_tail_forecasts.pkl'
+# Forecast horizon of bars without training rows, when long_tail_horizon is not set
+BASELINE_HORIZON = 28
+
+logger = logging.getLogger(__name__)
+
+
+def build_features(dataset_filled: pd.DataFrame) -> pd.DataFrame:
+    pipeline = Pipeline(steps=[
+                           ('metadata_tf', MetadataTransformer()),
+                           ('calendar_tf', CalendarTransformer()),
+                           ('holidays_tf', HolidaysTransformer()),
+                           ('holiday_distance_tf', HolidayDistanceTransformer()),
+                           ('lagged_sales_tf', LaggedSalesTransformer()),
+                           ('weekday_averages_tf', WeekdayAveragesTransformer())
+                            ])
+    dataset_w_feats = pipeline.fit_transform(dataset_filled)
+    # Sales value is dropped from features but kept for dashboard
+    dataset_w_feats.loc[:, 'sales_value'] = dataset_filled['sales_value'].values
+    return dataset_w_feats
+
+
+@instrument('process_store')
+def process_store(store_dir: str,
+                  output_dir: str,
+                  years: list = YEARS,
+                  valid_split_date: str = VALID_SPLIT_DATE,
+                  test_split_date: str = TEST_SPLIT_DATE,
+                  long_tail_horizon: int = None) -> dict:
+    """Load, fill, featurize, train and score one store shard.
+    Booster (also as compact trees file), predictions and simulated inventory are saved
+    to {output_dir}/{store}/.
+    If long_tail_horizon is set, only dense items are used for booster and long-tail items
+    are forecasted long_tail_horizon days ahead with baselines (models/baselines.py).
+    Stores without rows before valid_split_date (new bars) get no booster, all their items
+    are forecasted with baselines (long_tail_horizon or BASELINE_HORIZON days ahead).
+
+    Returns:
+    --------
+    summary: store paths, number of rows and errors (model and predictions paths are None
+             for stores without booster)
+    """
+    store_output_dir = os.path.join(output_dir, os.path.basename(os.path.normpath(store_dir)))
+    os.makedirs(store_output_dir, exist_ok=True)
+    dataset = load_dataset(store_dir, store_years(store_dir, years)).set_index('sales_date')
+    baseline_forecasts_path = os.path.join(store_output_dir, BASELINE_FORECASTS_FILENAME)
+    if not (dataset.index < valid_split_date).any():
+        forecast_baselines(dataset, long_tail_horizon or BASELINE_HORIZON,
+                           end=dataset.index.max()).to_pickle(baseline_forecasts_path)
+        return {
+            'bar_name': dataset['bar_name'].iloc[0],
+            'model_key': os.path.basename(store_output_dir),
+            'model_path': None,
+            'predictions_path': None,
+            'inventory_path': None,
+            'baseline_forecasts_path': baseline_forecasts_path,
+            'rows': 0
+        }
+    if long_tail_horizon:
+        dense = dense_items(dataset)
+        long_tail = dataset[~dataset['item_name'].isin(dense)]
+        if len(long_tail):
+            # Long-tail rows are only days with sales, history spans all days of store data
+            forecast_baselines(long_tail, long_tail_horizon, start=dataset.index.min(),
+                               end=dataset.index.max()).to_pickle(baseline_forecasts_path)
+        else:
+            baseline_forecasts_path = None
+        dataset = dataset[dataset['item_name'].isin(dense)]
+    else:
+        baseline_forecasts_path = None
+    dataset_filled = fill_series(dataset)
+    del dataset
+    inventory_path = os.path.join(store_output_dir, INVENTORY_FILENAME)
+    simulate_inventory(dataset_filled).to_pickle(inventory_path)
+    dataset_w_feats = build_features(dataset_filled)
+    del dataset_filled
+
+    train_mask = (dataset_w_feats.index < valid_split_date)
+    valid_mask = (dataset_w_feats.index >= valid_split_date) & (dataset_w_feats.index < test_split_date)
+    booster = train_booster(dataset_w_feats[train_mask], PREDICTORS,
+                            valid_df=dataset_w_feats[valid_mask] if valid_mask.any() else None)
+    model_path = os.path.join(store_output_dir, MODEL_FILENAME)
+    booster.save_model(model_path)
+    compact_model_path = export_booster(booster, os.path.splitext(model_path)[0] + COMPACT_EXTENSION)
+
+    predictions_df = predict(booster, dataset_w_feats)
+    predictions_path = os.path.join(store_output_dir, PREDICTIONS_FILENAME)
+    predictions_df.to_pickle(predictions_path)
+    test_mask = (predictions_df.index >= test_split_date)
+    errors = calculate_errors(predictions_df[~test_mask]['sales_qty'], predictions_df[test_mask]['sales_qty'],
+                              predictions_df[~test_mask]['prediction'], predictions_df[test_mask]['prediction'])
+    train_dates = dataset_w_feats[train_mask].index
+    return {
+        'bar_name': predictions_df['bar_name'].iloc[0],
+        'model_key': os.path.basename(store_output_dir),
+        'model_path': model_path,
+        'compact_model_path': compact_model_path,
+        'feature_names': booster.feature_names,
+        'training_window': [train_dates.min().strftime('%Y-%m-%d'), train_dates.max().strftime('%Y-%m-%d')],
+        'predictions_path': predictions_path,
+        'inventory_path': inventory_path,
+        'baseline_forecasts_path': baseline_forecasts_path,
+        'rows': len(predictions_df),
+        **errors
+    }
+
+
+@instrument('run_multi_store_pipeline')
+def run_multi_store_pipeline(data_dir: str = RAW_DATA_DIR,
+                             output_dir: str = PROCESSED_DATA_DIR,
+                             years: list = YEARS,
+                             n_workers: int = None,
+                             registry_path: str = REGISTRY_PATH,
+                             model_version: str = None,
+                             long_tail_horizon: int = None) -> pd.DataFrame:
+    """Shard raw data by store and process every store in parallel.
+    Predictions and simulated inventory of all stores are merged into
+    {output_dir}/dataset_with_predictions.pkl and {output_dir}/inventory_data_top40.pkl,
+    read by the dashboard (totals over all stores are aggregated there).
+    Store boosters are registered in model registry under store key and model_version
+    (date of training if None). See process_store for long_tail_horizon and stores without
+    training rows. Failure of one store is logged and does not stop other stores.
+
+    Returns:
+    --------
+    summary_df: one row per store with paths and errors ('error' of failed stores)
+    """
+    shards_dir = os.path.join(output_dir, 'shards')
+    store_dirs = partition_raw_by_store(data_dir, shards_dir, years, n_workers=n_workers)
+    results = run_sharded(process_store, store_dirs, n_workers, return_exceptions=True,
+                          output_dir=output_dir, years=years, long_tail_horizon=long_tail_horizon)
+    summaries = []
+    for store_dir, result in results.items():
+        if isinstance(result, Exception):
+            logger.error('Store %s failed: %r', os.path.basename(store_dir), result)
+            result = {'model_key': os.path.basename(store_dir), 'error': repr(result)}
+        summaries.append(result)
+    summary_df = pd.DataFrame(summaries)
+    trained = [summary for summary in summaries if summary.get('model_path')]
+    if not trained:
+        raise ValueError(f'No store in {data_dir} has a trained booster, see summary: {summaries}')
+
+    registry = ModelRegistry(registry_path)
+    model_version = model_version or pd.Timestamp.now().strftime('%Y%m%d')
+    for summary in trained:
+        registry.register(summary['model_key'], model_version, summary['model_path'],
+                          feature_names=summary['feature_names'],
+                          training_window=summary['training_window'],
+                          metrics={metric: summary[metric] for metric in ('train_wmape', 'test_wmape', 'train_wbias', 'test_wbias')},
+                          hot=True, compact_path=summary['compact_model_path'])
+
+    merge_store_results([summary['predictions_path'] for summary in trained]).to_pickle(
+        os.path.join(output_dir, PREDICTIONS_FILENAME))
+    merge_store_results([summary['inventory_path'] for summary in trained]).to_pickle(
+        os.path.join(output_dir, INVENTORY_FILENAME))
+    return summary_df
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train and score one model per bar.')
+    parser.add_argument('--data-dir', default=RAW_DATA_DIR)
+    parser.add_argument('--output-dir', default=PROCESSED_DATA_DIR)
+    parser.add_argument('--years', nargs='+', default=YEARS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--registry', default=REGISTRY_PATH)
+    parser.add_argument('--model-version', default=None)
+    parser.add_argument('--long-tail-horizon', type=int, default=None,
+                        help='forecast long-tail items with baselines for this many days')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    print(run_multi_store_pipeline(args.data_dir, args.output_dir, args.years, args.workers,
+                                   args.registry, args.model_version, args.long_tail_horizon))
@@ -1,8 +1,14 @@
+import time
+PAGE_START_TIME = time.perf_counter()
 import streamlit as st
 from src.utils import get_project_root
+from src.streamlit_app.helper_functions import report_performance
+from src.streamlit_app.warmup import start_warm_up
 
 
 st.set_page_config(layout="wide")
+# Datasets, booster and heavy modules are loaded in background while landing page is read
+warm_up_timings = start_warm_up()
 
 st.title(':coffee: Caffe bar sales, predictions and inventory analysis :wine_glass:')
 st.write('')
@@ -18,3 +24,9 @@ st.write("""On Main Overview page, first section is KPIs overview, here we can s
 st.subheader('Content')
 st.markdown('1. Main Overview')
 st.markdown('2. Model Evaluation')
+
+if 'total' in warm_up_timings:
+    st.sidebar.caption(f"Warm-up done in {warm_up_timings['total']:.1f} s")
+elif 'error' in warm_up_timings:
+    st.sidebar.warning(f"Warm-up failed: {warm_up_timings['error']}")
+report_performance('Introduction', PAGE_START_TIME)
@@ -1,17 +1,101 @@
-import xgboost
+import sys
+import time
+import importlib
 import pandas as pd
 import streamlit as st
+from src.instrumentation import instrument
+from src.streamlit_app.queries import select_store, get_stores
+from src.models.registry import ModelRegistry
 
+# Import times (s) of lazily imported modules in this server process
+IMPORT_TIMES = {}
 
-@st.cache_data
+
+def lazy_import(module_name: str):
+    """Import module on first use and record how long the import took."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    start_time = time.perf_counter()
+    module = importlib.import_module(module_name)
+    IMPORT_TIMES[module_name] = time.perf_counter() - start_time
+    return module
+
+
+# Datasets are cached as shared resources (no copy on every rerun), pages must not modify them
+@st.cache_resource
+@instrument('streamlit_load_dataset')
 def load_dataset(dataset_path: str) -> pd.DataFrame:
     return pd.read_pickle(dataset_path)
 
 
 @st.cache_resource
-def load_booster(booster_path: str):
-    booster = xgboost.Booster()
-    booster.load_model(booster_path)
-    if booster.attr('feature_names') is not None: 
-        booster.feature_names = booster.attr('feature_names').split('|')  
-    return booster
\ No newline at end of file
+def load_store_dataset(dataset_path: str, bar_name: str) -> pd.DataFrame:
+    # Selected bar data (or totals over all bars) is cached per bar
+    return select_store(load_dataset(dataset_path), bar_name)
+
+
+@st.cache_resource
+def get_dataset_lookups(dataset_path: str, bar_name: str) -> dict:
+    """Item list and date bounds of bar dataset, derived once per server process."""
+    data_df = load_store_dataset(dataset_path, bar_name)
+    return {
+        'items': data_df.item_name.unique().tolist(),
+        'date_min': data_df.index.min().date(),
+        'date_max': data_df.index.max().date()
+    }
+
+
+def clamp_date(date, lookups: dict):
+    """Date limited to dataset date bounds, st.date_input fails on default outside of them."""
+    return min(max(date, lookups['date_min']), lookups['date_max'])
+
+
+@st.cache_resource
+def get_dataset_stores(dataset_path: str) -> list:
+    return get_stores(load_dataset(dataset_path))
+
+
+@st.cache_resource
+def get_model_registry() -> ModelRegistry:
+    # One registry (and its LRU cache of boosters) per server process
+    return ModelRegistry()
+
+
+@st.cache_resource(max_entries=4)
+def get_model_predictions(dataset_path: str, bar_name: str, model_key: str, model_version: str,
+                          registered_at: str = None) -> tuple:
+    """Bar dataset with predictions of selected model version. Stored predictions are kept
+    if dataset does not have all model features (eg. totals over all bars).
+    registered_at (from registry metadata) only keys the cache, so predictions of a version
+    re-registered under the same name (eg. rerun of pipeline on the same day) are recomputed.
+
+    Returns:
+    --------
+    predictions_df: dataset with 'prediction' column
+    missing_features: model features missing in dataset, predictions are stored ones if not empty
+    """
+    data_df = load_store_dataset(dataset_path, bar_name)
+    registry = get_model_registry()
+    booster = registry.load(model_key, model_version)
+    missing_features = [feature for feature in booster.feature_names or [] if feature not in data_df.columns]
+    if not booster.feature_names or missing_features:
+        return data_df, missing_features or ['feature_names']
+    return registry.predict(data_df, model_key, model_version), []
+
+
+@st.cache_resource
+def get_render_times() -> dict:
+    # First and last render time (s) per page, shared by all sessions
+    return {}
+
+
+def report_performance(page_name: str, start_time: float):
+    """Show page render time and lazy import times in sidebar."""
+    render_time = time.perf_counter() - start_time
+    render_times = get_render_times()
+    first_render_time = render_times.setdefault(page_name, {'first': render_time})['first']
+    render_times[page_name]['last'] = render_time
+    with st.sidebar.expander('Performance'):
+        st.write(f'Render time: {render_time:.2f} s (first render: {first_render_time:.2f} s)')
+        for module_name, import_time in IMPORT_TIMES.items():
+            st.write(f'Import {module_name}: {import_time:.2f} s')
@@ -1,13 +1,14 @@
+import time
+PAGE_START_TIME = time.perf_counter()
 import datetime
-import numpy as np
-import pandas as pd
 import streamlit as st
-import plotly.express as px
-import matplotlib.pyplot as plt
-from dateutil.relativedelta import relativedelta
 from src.utils import get_project_root
-from src.evaluation.scoring import wbias, wmape, bias
-from src.streamlit_app.helper_functions import load_dataset
+from src.streamlit_app.helper_functions import (load_store_dataset, get_dataset_lookups, get_dataset_stores,
+                                                clamp_date, lazy_import, report_performance)
+from src.streamlit_app.warmup import start_warm_up
+from src.streamlit_app.queries import (get_inventory_on_current_date, get_aggregated_predictions,
+                                       get_last_365d_sales, KPIsCalculation, ALL_STORES,
+                                       get_item_class_predictions)
 
 
 DATE_FROM = datetime.date(2019, 1, 1)
@@ -18,114 +19,8 @@ WHOLE_DATASET_PATH = DATASETS_FOLDER / 'dataset_with_predictions.pkl'
 INVENTORY_DATASET_PATH = DATASETS_FOLDER / 'inventory_data_top40.pkl'
 
 
-def get_inventory_on_current_date(inventory_df, items_list, selected_date):
-    c1 = (inventory_df.item_name.isin(items_list))
-    c2 = (inventory_df.index == str(selected_date))
-
-    return inventory_df[c1 & c2].groupby('item_name')['inventory'].sum().reset_index()
-
-
-def get_aggregated_predictions(predictions_df, items_list, date_from, date_to):
-    c1 = (predictions_df.item_name.isin(items_list))
-    c2 = (predictions_df.index >= str(date_from))
-    c3 = (predictions_df.index <= str(date_to))
-    predictions_by_item = predictions_df[c1 & c2 & c3].groupby('item_name')['prediction'].sum().reset_index() 
-    predictions_by_item['prediction'] = predictions_by_item['prediction'].round().astype('int')
-
-    return predictions_by_item  
-
-
-def get_last_365d_sales(sales_df, items_list, current_date):
-    c1 = (sales_df.item_name.isin(items_list))
-    c2 = (sales_df.index >= str(current_date - datetime.timedelta(days=365)))
-    c3 = (sales_df.index <= str(current_date - datetime.timedelta(days=1)))
-    sales_by_item = sales_df[c1 & c2 & c3].groupby('item_name')['sales_qty'].sum().reset_index().sort_values(by='sales_qty', ascending=False)
-
-    return sales_by_item
-
-
-
-class KPIsCalculation:
-
-    def __init__(self, current_date):
-        self.current_date = current_date
-        self.current_year = self.current_date.year
-        self.last_year = self.current_year - 1
-        self.year_ago_date = self.current_date - relativedelta(years=1)
-
-
-    def get_yoy_sales(self, sales_df):
-        # Calculate total sales YTD and compare with last year, same period
-
-        c1 = (sales_df.index.year == self.last_year)
-        c2 = (sales_df.index < str(self.year_ago_date)) 
-        c3 = (sales_df.index.year == self.current_year)
-        c4 = (sales_df.index < str(self.current_date))
-
-        last_year_totals = sales_df[c1 & c2][['sales_qty', 'sales_value']].sum()
-        this_year_totals = sales_df[c3 & c4][['sales_qty', 'sales_value']].sum()
-
-        percent_change_qty = -(1 - (this_year_totals['sales_qty']/last_year_totals['sales_qty'])).round(2)*100
-        percent_change_val = -(1 - (this_year_totals['sales_value']/last_year_totals['sales_value'])).round(2)*100
-
-        return (
-            this_year_totals['sales_qty'],
-            this_year_totals['sales_value'],
-            percent_change_qty,
-            percent_change_val
-            )
-
-     
-    def get_yoy_predictions(self, predictions_df):
-        # Predictions
-        c1 = (predictions_df.index.year == self.last_year)
-        c2 = (predictions_df.index < str(self.year_ago_date)) 
-        c3 = (predictions_df.index.year == self.current_year)
-        c4 = (predictions_df.index < str(self.current_date))
-
-        last_year_preds = predictions_df[c1 & c2][['sales_qty', 'prediction']]
-        this_year_preds = predictions_df[c3 & c4][['sales_qty', 'prediction']]
-
-        last_year_wmape = wmape(last_year_preds['sales_qty'], last_year_preds['prediction'])
-        this_year_wmape = wmape(this_year_preds['sales_qty'], this_year_preds['prediction'])
-
-        last_year_bias = bias(last_year_preds['sales_qty'], last_year_preds['prediction'])
-        this_year_bias = bias(this_year_preds['sales_qty'], this_year_preds['prediction'])
-
-        wmape_pp_change = last_year_wmape - this_year_wmape
-        bias_pp_change = abs(last_year_bias) - abs(this_year_bias)
-
-        return (
-            wmape_pp_change,
-            bias_pp_change,
-            this_year_wmape,
-            this_year_bias
-            )
-
-
-    def get_yoy_inventory(self, inventory_df):    
-
-        # Inventory
-        c1 = (inventory_df.index.year == self.last_year)
-        c2 = (inventory_df.index < str(self.year_ago_date)) 
-        c3 = (inventory_df.index.year == self.current_year)
-        c4 = (inventory_df.index < str(self.current_date))
-
-        last_year_inv = inventory_df[c1 & c2][['sales_qty', 'inventory']]
-        this_year_inv = inventory_df[c3 & c4][['sales_qty', 'inventory']]  
-
-        last_year_oos_cases= len(last_year_inv[(last_year_inv.inventory < last_year_inv.sales_qty)])
-        this_year_oos_cases= len(this_year_inv[(this_year_inv.inventory < this_year_inv.sales_qty)])
-
-        percent_change_cases = round(-(1 - (this_year_oos_cases/last_year_oos_cases))*100, 1)
-
-        return (
-            percent_change_cases,
-            this_year_oos_cases
-            ) 
-
-
 def visualize_last_365d_sales(sales_df):    
+    px = lazy_import('plotly.express')
     fig = px.bar(
         sales_df, 
         x='item_name', 
@@ -137,19 +32,29 @@ def visualize_last_365d_sales(sales_df):
 
 
 st.set_page_config(layout="wide")
+# Warm-up runs once per server process, whichever page is opened first
+start_warm_up()
 
-dataset_with_predictions = load_dataset(WHOLE_DATASET_PATH)
-dataset_with_inventory = load_dataset(INVENTORY_DATASET_PATH)
-all_items = dataset_with_predictions.item_name.unique().tolist()
+stores = get_dataset_stores(WHOLE_DATASET_PATH)
 # Sidebar
 ## Title
 with st.sidebar:
     st.title(':chart_with_upwards_trend: Main Overview :chart_with_upwards_trend:')
-    st.subheader('1. Select items')
+    st.subheader('1. Select bar')
+    selected_store = st.selectbox('Which bar you want summary for?', [ALL_STORES] + stores)
+
+dataset_with_predictions = load_store_dataset(WHOLE_DATASET_PATH, selected_store)
+dataset_with_inventory = load_store_dataset(INVENTORY_DATASET_PATH, selected_store)
+lookups = get_dataset_lookups(WHOLE_DATASET_PATH, selected_store)
+all_items = lookups['items']
+
+with st.sidebar:
+    st.subheader('2. Select items')
     items_list = st.multiselect('Which items you want inventory and predictions summary for?', all_items, default=all_items)
-    st.subheader('2. Select current date')
-    current_date = st.date_input("Current date:", datetime.date(2019, 3, 1))
-    st.subheader('3. Select last date in future')
+    st.subheader('3. Select current date')
+    current_date = st.date_input("Current date:", clamp_date(datetime.date(2019, 3, 1), lookups),
+                                 min_value=lookups['date_min'], max_value=lookups['date_max'])
+    st.subheader('4. Select last date in future')
     selected_date = st.slider(
              "Select days from current_date for future summary",
              min_value=current_date,
@@ -194,7 +99,18 @@ st.dataframe(
         'inventory_at_selected_date': 'Inventory at selected date (End of day)'},
     hide_index=True)
 
+if 'item_class' in dataset_with_predictions.columns:
+    st.header(f'2.1 How much will we sell per item class? (Total predicted sales {current_date} to {selected_date})')
+    item_class_predictions = get_item_class_predictions(dataset_with_predictions, items_list, current_date, selected_date)
+    st.dataframe(
+        item_class_predictions,
+        column_config={
+            'name': 'Item class',
+            'prediction': f'Total predicted sales ({current_date} to {selected_date})'},
+        hide_index=True)
+
 st.header(f'3. What are the top selling items? (Total sales quantity in 365 days before {current_date})')
 sales_last_365d = get_last_365d_sales(dataset_with_predictions, all_items, current_date)
 visualize_last_365d_sales(sales_last_365d)
 
+report_performance('Main Overview', PAGE_START_TIME)
@@ -1,15 +1,15 @@
-import shap
-import xgboost
+import time
+PAGE_START_TIME = time.perf_counter()
 import datetime
 import numpy as np
-import pandas as pd
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-import matplotlib.pyplot as plt
 from src.utils import get_project_root
-from src.evaluation.scoring import wmape, wbias
-from src.streamlit_app.helper_functions import load_booster, load_dataset
+from src.streamlit_app.helper_functions import (get_model_registry, get_model_predictions, get_dataset_lookups,
+                                                get_dataset_stores, clamp_date, lazy_import, report_performance)
+from src.streamlit_app.queries import calculate_scores_per_item_last_365d, ALL_STORES
+from src.data.sharding import store_key
+from src.streamlit_app.warmup import start_warm_up
+from src.models.compact_trees import CompactTrees
 
 
 DATE_FROM = datetime.date(2017, 1, 1)
@@ -18,7 +18,6 @@ DATE_TO = datetime.date(2019, 12, 31)
 DATASETS_FOLDER = get_project_root() / 'data/processed'
 WHOLE_DATASET_PATH = DATASETS_FOLDER / 'dataset_with_predictions.pkl'
 INVENTORY_DATASET_PATH = DATASETS_FOLDER / 'inventory_data_top40.pkl'
-BOOSTER_PATH = get_project_root() / 'models/xgb_caffe_bar_demand_forecast_v1.bst'
 
 
 def visualize_preds(predictions_df, item_name, date_from, current_date, date_to):
@@ -27,6 +26,7 @@ def visualize_preds(predictions_df, item_name, date_from, current_date, date_to)
     c3 = (predictions_df.index <= str(date_to))
     preds_visualize = predictions_df[c1 & c2 & c3].copy()
     preds_visualize.loc[(preds_visualize.index >= str(current_date)), 'sales_qty'] = np.nan
+    px = lazy_import('plotly.express')
     fig = px.line(preds_visualize,
                 y=['sales_qty', 'prediction'],
                 #barmode="group",
@@ -44,22 +44,8 @@ def visualize_preds(predictions_df, item_name, date_from, current_date, date_to)
     st.plotly_chart(fig, theme="streamlit")
 
 
-def calculate_scores_per_item_last_365d(sales_and_predictions_df, current_date):
-    # Calculate scores for last 365 days
-    c1 = (sales_and_predictions_df.index >= str(current_date - datetime.timedelta(days=365)))
-    c2 = (sales_and_predictions_df.index <= str(current_date - datetime.timedelta(days=1)))
-    scores_df = sales_and_predictions_df[c1 & c2].groupby('item_name').apply(
-        lambda x: pd.Series({
-            'bias': wbias(x['sales_qty'], x['prediction']), 
-            'wmape': wmape(x['sales_qty'], x['prediction']),
-            'total_sales': x['sales_qty'].sum(),
-            'total_prediction': x['prediction'].sum()})
-        ).sort_values(by='total_sales', ascending=False).reset_index()
-
-    return scores_df
-
-
 def visualize_totals(scores_df):
+    go = lazy_import('plotly.graph_objects')
     # Create the figure
     fig = go.Figure()
     X_axis = np.arange(len(scores_df['item_name']))
@@ -156,6 +142,8 @@ def visualize_totals(scores_df):
 
 def visualize_shap_waterfall(predictions_df, item_name, prediction_date):
 
+    shap = lazy_import('shap')
+    plt = lazy_import('matplotlib.pyplot')
     c1 = (predictions_df['item_name'] == item_name) 
     c2 = (predictions_df.index == str(prediction_date))
 
@@ -179,29 +167,64 @@ def visualize_shap_waterfall(predictions_df, item_name, prediction_date):
 
 
 st.set_page_config(layout="wide")
+# Warm-up runs once per server process, whichever page is opened first
+start_warm_up()
 
-dataset_with_predictions = load_dataset(WHOLE_DATASET_PATH)
-dataset_with_inventory = load_dataset(INVENTORY_DATASET_PATH)
-booster = load_booster(BOOSTER_PATH)
-all_items = dataset_with_predictions.item_name.unique().tolist()
+stores = get_dataset_stores(WHOLE_DATASET_PATH)
+registry = get_model_registry()
 
 st.title('Model evaluation')
 
 with st.sidebar:
     
     st.title(':female-scientist: Model evaluation :male-scientist:')
-    st.header('1. Select current date.')
-    current_date = st.date_input("Current date:", datetime.date(2019, 3, 1))
-    st.header('2. Select demand forecast analysis inputs.')
+    st.header('1. Select bar.')
+    selected_store = st.selectbox('Which bar you want to evaluate?', [ALL_STORES] + stores)
+    st.header('2. Select model.')
+    model_keys = registry.keys()
+    if not model_keys:
+        st.error('No models are registered, train models first.')
+        st.stop()
+    # Model of selected bar is preselected if there is one
+    default_key = store_key(selected_store)
+    model_key = st.selectbox('Model:', model_keys,
+                             index=model_keys.index(default_key) if default_key in model_keys else 0)
+    model_versions = registry.versions(model_key)
+    model_version = st.selectbox('Version:', model_versions,
+                                 index=model_versions.index(registry.latest_version(model_key)))
+    model_metadata = registry.metadata(model_key, model_version)
+    if model_metadata.get('training_window'):
+        st.caption('Trained on {} to {}'.format(*model_metadata['training_window']))
+    for metric, value in model_metadata.get('metrics', {}).items():
+        st.caption(f'{metric}: {value}')
+
+booster = registry.load(model_key, model_version)
+dataset_with_predictions, missing_features = get_model_predictions(WHOLE_DATASET_PATH, selected_store,
+                                                                  model_key, model_version,
+                                                                  model_metadata.get('registered_at'))
+if missing_features:
+    st.warning(f"Dataset does not have features of model {model_key} {model_version} "
+               f"({', '.join(missing_features[:5])}{', ...' if len(missing_features) > 5 else ''}), "
+               "stored predictions are shown.")
+lookups = get_dataset_lookups(WHOLE_DATASET_PATH, selected_store)
+all_items = lookups['items']
+
+with st.sidebar:
+    st.header('3. Select current date.')
+    current_date = st.date_input("Current date:", clamp_date(datetime.date(2019, 3, 1), lookups),
+                                 min_value=lookups['date_min'], max_value=lookups['date_max'])
+    st.header('4. Select demand forecast analysis inputs.')
     ## Input date range for predictions
-    date_from = st.date_input("From date:", DATE_FROM)
-    date_to = st.date_input("To date:", DATE_TO)
+    date_from = st.date_input("From date:", clamp_date(DATE_FROM, lookups),
+                              min_value=lookups['date_min'], max_value=lookups['date_max'])
+    date_to = st.date_input("To date:", max(clamp_date(DATE_TO, lookups), date_from),
+                            min_value=date_from, max_value=lookups['date_max'])
     selected_item = st.selectbox('Select item to visualize predictions.', all_items)
     selected_date = st.slider(
              "Select date for single prediction analysis",
              min_value=date_from,
              max_value=date_to,
-             value=current_date,
+             value=min(max(current_date, date_from), date_to),
              format="DD/MM/YYYY")
 
   
@@ -213,7 +236,13 @@ st.header(f'2. How do predictions for {selected_item} look like? ({date_from} to
 visualize_preds(dataset_with_predictions, selected_item, date_from, current_date, date_to)
 
 st.subheader(f'2.1 Which are the most important features for {selected_date}?')
-visualize_shap_waterfall(dataset_with_predictions, selected_item, selected_date)
-
-
-
+if len(stores) > 1 and selected_store == ALL_STORES:
+    st.info('Select a single bar to see feature contributions.')
+elif missing_features:
+    st.info('Feature contributions need all features of selected model.')
+elif isinstance(booster, CompactTrees):
+    st.info('Feature contributions need xgboost booster, register .bst file of this model.')
+else:
+    visualize_shap_waterfall(dataset_with_predictions, selected_item, selected_date)
+
+report_performance('Model Evaluation', PAGE_START_TIME)
@@ -0,0 +1,168 @@
+import datetime
+import pandas as pd
+from src.evaluation.scoring import wbias, wmape, bias
+from src.instrumentation import instrument
+from src.data.sharding import aggregate_across_stores
+
+ALL_STORES = 'All bars'
+
+
+def get_stores(data_df):
+    if 'bar_name' not in data_df.columns:
+        return []
+    return sorted(data_df.bar_name.unique().tolist())
+
+
+@instrument('select_store')
+def select_store(data_df, bar_name):
+    # Datasets without bar_name column are single bar datasets
+    if 'bar_name' not in data_df.columns:
+        return data_df
+    if bar_name == ALL_STORES:
+        return aggregate_across_stores(data_df) if data_df.bar_name.nunique() > 1 else data_df
+    return data_df[data_df.bar_name == bar_name]
+
+
+@instrument('get_inventory_on_current_date')
+def get_inventory_on_current_date(inventory_df, items_list, selected_date):
+    c1 = (inventory_df.item_name.isin(items_list))
+    c2 = (inventory_df.index == str(selected_date))
+
+    return inventory_df[c1 & c2].groupby('item_name')['inventory'].sum().reset_index()
+
+
+@instrument('get_aggregated_predictions')
+def get_aggregated_predictions(predictions_df, items_list, date_from, date_to):
+    c1 = (predictions_df.item_name.isin(items_list))
+    c2 = (predictions_df.index >= str(date_from))
+    c3 = (predictions_df.index <= str(date_to))
+    predictions_by_item = predictions_df[c1 & c2 & c3].groupby('item_name')['prediction'].sum().reset_index() 
+    predictions_by_item['prediction'] = predictions_by_item['prediction'].round().astype('int')
+
+    return predictions_by_item  
+
+
+@instrument('get_item_class_predictions')
+def get_item_class_predictions(predictions_df, items_list, date_from, date_to):
+    # Item forecasts are summed to item classes and total through hierarchy summing matrix
+    from src.models.hierarchy import hierarchical_forecasts  # scipy is imported only when needed
+    c1 = (predictions_df.item_name.isin(items_list))
+    c2 = (predictions_df.index >= str(date_from))
+    c3 = (predictions_df.index <= str(date_to))
+    forecasts_df = hierarchical_forecasts(predictions_df[c1 & c2 & c3], method='bottom_up')
+    predictions_by_class = forecasts_df.sum(axis=1).rename('prediction').reset_index()
+    predictions_by_class = predictions_by_class[predictions_by_class.level != 'item_name'].drop(columns=['level'])
+    predictions_by_class['prediction'] = predictions_by_class['prediction'].round().astype('int')
+
+    return predictions_by_class
+
+
+@instrument('get_last_365d_sales')
+def get_last_365d_sales(sales_df, items_list, current_date):
+    c1 = (sales_df.item_name.isin(items_list))
+    c2 = (sales_df.index >= str(current_date - datetime.timedelta(days=365)))
+    c3 = (sales_df.index <= str(current_date - datetime.timedelta(days=1)))
+    sales_by_item = sales_df[c1 & c2 & c3].groupby('item_name')['sales_qty'].sum().reset_index().sort_values(by='sales_qty', ascending=False)
+
+    return sales_by_item
+
+
+
+class KPIsCalculation:
+
+    def __init__(self, current_date):
+        from dateutil.relativedelta import relativedelta
+        self.current_date = current_date
+        self.current_year = self.current_date.year
+        self.last_year = self.current_year - 1
+        self.year_ago_date = self.current_date - relativedelta(years=1)
+
+
+    @instrument()
+    def get_yoy_sales(self, sales_df):
+        # Calculate total sales YTD and compare with last year, same period
+
+        c1 = (sales_df.index.year == self.last_year)
+        c2 = (sales_df.index < str(self.year_ago_date)) 
+        c3 = (sales_df.index.year == self.current_year)
+        c4 = (sales_df.index < str(self.current_date))
+
+        last_year_totals = sales_df[c1 & c2][['sales_qty', 'sales_value']].sum()
+        this_year_totals = sales_df[c3 & c4][['sales_qty', 'sales_value']].sum()
+
+        percent_change_qty = -(1 - (this_year_totals['sales_qty']/last_year_totals['sales_qty'])).round(2)*100
+        percent_change_val = -(1 - (this_year_totals['sales_value']/last_year_totals['sales_value'])).round(2)*100
+
+        return (
+            this_year_totals['sales_qty'],
+            this_year_totals['sales_value'],
+            percent_change_qty,
+            percent_change_val
+            )
+
+     
+    @instrument()
+    def get_yoy_predictions(self, predictions_df):
+        # Predictions
+        c1 = (predictions_df.index.year == self.last_year)
+        c2 = (predictions_df.index < str(self.year_ago_date)) 
+        c3 = (predictions_df.index.year == self.current_year)
+        c4 = (predictions_df.index < str(self.current_date))
+
+        last_year_preds = predictions_df[c1 & c2][['sales_qty', 'prediction']]
+        this_year_preds = predictions_df[c3 & c4][['sales_qty', 'prediction']]
+
+        last_year_wmape = wmape(last_year_preds['sales_qty'], last_year_preds['prediction'])
+        this_year_wmape = wmape(this_year_preds['sales_qty'], this_year_preds['prediction'])
+
+        last_year_bias = bias(last_year_preds['sales_qty'], last_year_preds['prediction'])
+        this_year_bias = bias(this_year_preds['sales_qty'], this_year_preds['prediction'])
+
+        wmape_pp_change = last_year_wmape - this_year_wmape
+        bias_pp_change = abs(last_year_bias) - abs(this_year_bias)
+
+        return (
+            wmape_pp_change,
+            bias_pp_change,
+            this_year_wmape,
+            this_year_bias
+            )
+
+
+    @instrument()
+    def get_yoy_inventory(self, inventory_df):    
+
+        # Inventory
+        c1 = (inventory_df.index.year == self.last_year)
+        c2 = (inventory_df.index < str(self.year_ago_date)) 
+        c3 = (inventory_df.index.year == self.current_year)
+        c4 = (inventory_df.index < str(self.current_date))
+
+        last_year_inv = inventory_df[c1 & c2][['sales_qty', 'inventory']]
+        this_year_inv = inventory_df[c3 & c4][['sales_qty', 'inventory']]  
+
+        last_year_oos_cases= len(last_year_inv[(last_year_inv.inventory < last_year_inv.sales_qty)])
+        this_year_oos_cases= len(this_year_inv[(this_year_inv.inventory < this_year_inv.sales_qty)])
+
+        percent_change_cases = round(-(1 - (this_year_oos_cases/last_year_oos_cases))*100, 1)
+
+        return (
+            percent_change_cases,
+            this_year_oos_cases
+            )
+
+
+@instrument('calculate_scores_per_item_last_365d')
+def calculate_scores_per_item_last_365d(sales_and_predictions_df, current_date):
+    # Calculate scores for last 365 days
+    c1 = (sales_and_predictions_df.index >= str(current_date - datetime.timedelta(days=365)))
+    c2 = (sales_and_predictions_df.index <= str(current_date - datetime.timedelta(days=1)))
+    scores_df = sales_and_predictions_df[c1 & c2].groupby('item_name').apply(
+        lambda x: pd.Series({
+            'bias': wbias(x['sales_qty'], x['prediction']), 
+            'wmape': wmape(x['sales_qty'], x['prediction']),
+            'total_sales': x['sales_qty'].sum(),
+            'total_prediction': x['prediction'].sum()})
+        ).sort_values(by='total_sales', ascending=False).reset_index()
+
+    return scores_df
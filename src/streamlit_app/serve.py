@@ -0,0 +1,39 @@
+"""Start Streamlit server with warm-up of caches started before the first request.
+
+Usage (from project root):
+    python -m src.streamlit_app.serve [--server.port 8501 ...]
+"""
+import sys
+import time
+import logging
+import threading
+from streamlit.web import bootstrap
+from streamlit.runtime import Runtime
+from src.streamlit_app.warmup import start_warm_up
+
+MAIN_SCRIPT_PATH = 'src/streamlit_app/Introduction.py'
+
+
+def warm_up_on_server_start():
+    # Runtime is created with the server, before it accepts connections
+    while not Runtime.exists():
+        time.sleep(0.1)
+    start_warm_up()
+
+
+def main(args: list):
+    logging.basicConfig(level=logging.INFO)
+    # Warm-up threads are not script runs, Streamlit warns on every cached call without it
+    # (filter is used because Streamlit resets log levels of its loggers on start)
+    logging.getLogger('streamlit.runtime.scriptrunner.script_run_context').addFilter(
+        lambda record: 'missing ScriptRunContext' not in record.getMessage())
+    flag_options = {}
+    for i in range(0, len(args) - 1, 2):
+        flag_options[args[i].lstrip('-').replace('.', '_')] = args[i + 1]
+    bootstrap.load_config_options(flag_options)
+    threading.Thread(target=warm_up_on_server_start, daemon=True).start()
+    bootstrap.run(MAIN_SCRIPT_PATH, 'streamlit run', [], flag_options)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
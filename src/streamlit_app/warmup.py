@@ -0,0 +1,59 @@
+import time
+import logging
+import threading
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+from src.utils import get_project_root
+from src.streamlit_app.queries import ALL_STORES
+from src.streamlit_app.helper_functions import (lazy_import, get_model_registry, load_store_dataset,
+                                                get_dataset_lookups, get_dataset_stores)
+
+DATASETS_FOLDER = get_project_root() / 'data/processed'
+WHOLE_DATASET_PATH = DATASETS_FOLDER / 'dataset_with_predictions.pkl'
+INVENTORY_DATASET_PATH = DATASETS_FOLDER / 'inventory_data_top40.pkl'
+HEAVY_MODULES = ['plotly.express', 'plotly.graph_objects', 'xgboost', 'shap', 'matplotlib.pyplot']
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(timings: dict):
+    """Preload datasets, lookups, hot set of boosters and heavy modules into server process caches."""
+    start_time = time.perf_counter()
+    for dataset_path in (WHOLE_DATASET_PATH, INVENTORY_DATASET_PATH):
+        for bar_name in [ALL_STORES] + get_dataset_stores(dataset_path):
+            load_store_dataset(dataset_path, bar_name)
+            get_dataset_lookups(dataset_path, bar_name)
+    timings['datasets'] = time.perf_counter() - start_time
+    get_model_registry().preload()
+    timings['models'] = time.perf_counter() - start_time
+    for module_name in HEAVY_MODULES:
+        try:
+            lazy_import(module_name)
+        except ImportError:
+            # Page using the module will fail on its own, warm-up of others continues
+            logger.warning('Warm-up could not import %s', module_name, exc_info=True)
+    timings['total'] = time.perf_counter() - start_time
+    logger.info('Warm-up done in %.1f s', timings['total'])
+
+
+def _run_warm_up(timings: dict):
+    # Exceptions in thread would be lost, they are logged and shown on Introduction page
+    try:
+        warm_up(timings)
+    except Exception as e:
+        logger.exception('Warm-up failed')
+        timings['error'] = f'{type(e).__name__}: {e}'
+
+
+@st.cache_resource
+def start_warm_up() -> dict:
+    """Start warm-up once per server process in background thread, so the page that
+    triggered it is not blocked. It is started by src/streamlit_app/serve.py on server
+    start and by every page otherwise. Returns warm-up timings, filled when warm-up is
+    done ('error' is set if it failed).
+    """
+    timings = {}
+    thread = threading.Thread(target=_run_warm_up, args=(timings,), daemon=True)
+    add_script_run_ctx(thread)
+    thread.start()
+    return timings
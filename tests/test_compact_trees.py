@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost
+from src.models.compact_trees import CompactTrees, export_booster
+from src.models.registry import ModelRegistry, COMPACT_MAX_ROWS
+
+FEATURES = [f'feature_{i}' for i in range(6)]
+
+
+def make_data(n_rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, len(FEATURES))).astype(np.float32)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    y = rng.poisson(np.exp(0.5 * np.nan_to_num(X[:, 0]) - 0.3 * np.nan_to_num(X[:, 1])))
+    return pd.DataFrame(X, columns=FEATURES), y
+
+
+def train(objective, early_stopping=False):
+    data_df, y = make_data()
+    train_set = xgboost.DMatrix(data_df[:1500], y[:1500])
+    valid_set = xgboost.DMatrix(data_df[1500:], y[1500:])
+    params = {'objective': objective, 'max_depth': 4, 'eta': 0.3, 'tree_method': 'hist'}
+    if early_stopping:
+        return xgboost.train(params, train_set, 200, evals=[(valid_set, 'valid')],
+                             early_stopping_rounds=5, verbose_eval=False)
+    return xgboost.train(params, train_set, 30)
+
+
+@pytest.mark.parametrize('objective, early_stopping', [
+    ('count:poisson', False),
+    ('count:poisson', True),
+    ('reg:squarederror', False),
+])
+def test_compact_trees_match_booster_predict(tmp_path, objective, early_stopping):
+    booster = train(objective, early_stopping)
+    compact = CompactTrees(export_booster(booster, str(tmp_path / 'model.trees')))
+    data_df, _ = make_data(seed=1)
+    iteration_range = (0, booster.best_iteration + 1) if early_stopping else (0, 0)
+    expected = booster.predict(xgboost.DMatrix(data_df), iteration_range=iteration_range)
+    assert compact.feature_names == FEATURES
+    np.testing.assert_allclose(compact.predict(data_df), expected, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(compact.predict(data_df.to_numpy()[:1]), expected[:1], rtol=1e-5, atol=1e-6)
+
+
+def test_registry_predict_uses_compact_trees_for_small_batches(tmp_path):
+    booster = train('count:poisson')
+    booster.set_attr(feature_names='|'.join(booster.feature_names))
+    booster_path = str(tmp_path / 'model.bst')
+    booster.save_model(booster_path)
+    registry = ModelRegistry(tmp_path / 'registry.json')
+    registry.register('bar', 'v1', booster_path, feature_names=FEATURES,
+                      compact_path=export_booster(booster, str(tmp_path / 'model.trees')))
+    data_df, _ = make_data(seed=1)
+
+    small_df = registry.predict(data_df[:COMPACT_MAX_ROWS], 'bar')
+    assert isinstance(registry.load_compact('bar'), CompactTrees)
+    assert registry.cached() == []
+    large_df = registry.predict(data_df, 'bar')
+    assert registry.cached() == [('bar', 'v1')]
+    np.testing.assert_allclose(small_df['prediction'], large_df['prediction'][:COMPACT_MAX_ROWS], rtol=1e-5)
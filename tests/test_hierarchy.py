@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.models.hierarchy import build_hierarchy, hierarchical_forecasts, reconcile, aggregate, TOTAL, UNKNOWN_CLASS
+
+ITEM_CLASSES = pd.Series(['Kava', 'Pivo', 'Kava', None, 'Voda'], index=['a', 'b', 'c', 'd', 'e'])
+
+
+def make_forecasts(S, n_dates=6, seed=0):
+    # Incoherent base forecasts of all nodes and residuals with different variances per node
+    rng = np.random.default_rng(seed)
+    base_forecasts = aggregate(S, rng.poisson(5, size=(S.shape[1], n_dates)).astype(float))
+    base_forecasts += rng.normal(scale=2, size=base_forecasts.shape)
+    residuals = rng.normal(size=(S.shape[0], 30)) * rng.uniform(0.5, 3, size=(S.shape[0], 1))
+    return base_forecasts, residuals
+
+
+def dense_mint(S, base_forecasts, precisions):
+    # MinT reconciliation S (S'W^-1S)^-1 S'W^-1 y with dense matrices
+    S = S.toarray()
+    W_inv = np.diag(precisions)
+    return S @ np.linalg.solve(S.T @ W_inv @ S, S.T @ W_inv @ base_forecasts)
+
+
+def test_build_hierarchy_puts_missing_class_into_unknown():
+    S, nodes = build_hierarchy(ITEM_CLASSES)
+    assert nodes['name'].tolist() == [TOTAL, 'Kava', 'Pivo', UNKNOWN_CLASS, 'Voda'] + list(ITEM_CLASSES.index)
+    # Every item is counted once in total, once in its class and once as itself
+    np.testing.assert_array_equal(S.sum(axis=0), np.full((1, len(ITEM_CLASSES)), 3))
+    np.testing.assert_array_equal(S[0].toarray(), np.ones((1, len(ITEM_CLASSES))))
+
+
+@pytest.mark.parametrize('method', ['ols', 'wls_struct', 'wls_var'])
+def test_mint_matches_dense_formula(method):
+    S, _ = build_hierarchy(ITEM_CLASSES)
+    base_forecasts, residuals = make_forecasts(S)
+    precisions = {
+        'ols': np.ones(S.shape[0]),
+        'wls_struct': 1 / np.asarray(S.sum(axis=1)).ravel(),
+        'wls_var': 1 / np.var(residuals, axis=1),
+    }[method]
+    reconciled = reconcile(base_forecasts, S, method, residuals=residuals)
+    np.testing.assert_allclose(reconciled, dense_mint(S, base_forecasts, precisions), rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(reconciled, aggregate(S, reconciled[-S.shape[1]:]), atol=1e-10)
+
+
+def test_top_down_splits_total_by_historical_proportions():
+    S, _ = build_hierarchy(ITEM_CLASSES)
+    base_forecasts, _ = make_forecasts(S)
+    actuals = np.array([[4, 4], [2, 0], [1, 1], [0, 0], [6, 2]], dtype=float)
+    reconciled = reconcile(base_forecasts, S, 'top_down', actuals=actuals)
+    np.testing.assert_allclose(reconciled[0], base_forecasts[0])
+    np.testing.assert_allclose(reconciled[-5:], actuals.sum(axis=1)[:, None] / actuals.sum() * base_forecasts[0])
+    with pytest.raises(ValueError):
+        reconcile(base_forecasts, S, 'top_down')
+
+
+def test_hierarchical_forecasts_sum_items_per_class_and_date():
+    dates = pd.to_datetime(['2019-01-01', '2019-01-01', '2019-01-02', '2019-01-02'])
+    predictions_df = pd.DataFrame({'item_name': ['a', 'b', 'a', 'c'], 'item_class': ['Kava', None, 'Kava', 'Kava'],
+                                   'prediction': [1.0, 2.0, 3.0, 4.0]}, index=dates)
+    forecasts_df = hierarchical_forecasts(predictions_df)
+    assert forecasts_df.loc[('total', TOTAL)].tolist() == [3.0, 7.0]
+    assert forecasts_df.loc[('item_class', 'Kava')].tolist() == [1.0, 7.0]
+    assert forecasts_df.loc[('item_class', UNKNOWN_CLASS)].tolist() == [2.0, 0.0]
+
+
+def test_hierarchical_forecasts_of_empty_selection():
+    predictions_df = pd.DataFrame({'item_name': pd.Series([], dtype=object), 'item_class': pd.Series([], dtype=object),
+                                   'prediction': pd.Series([], dtype=float)}, index=pd.DatetimeIndex([]))
+    forecasts_df = hierarchical_forecasts(predictions_df)
+    assert forecasts_df.index.tolist() == [('total', TOTAL)]
+    assert forecasts_df.shape == (1, 0)
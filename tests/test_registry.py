@@ -0,0 +1,33 @@
+import numpy as np
+import xgboost
+from src.models.registry import ModelRegistry
+
+
+def save_booster(path):
+    rng = np.random.default_rng(0)
+    booster = xgboost.train({'objective': 'count:poisson', 'max_depth': 2}, xgboost.DMatrix(rng.normal(size=(50, 3)),
+                            rng.poisson(2, size=50)), 3)
+    booster.save_model(str(path))
+    return str(path)
+
+
+def test_preload_loads_latest_hot_version_of_every_key(tmp_path):
+    path = save_booster(tmp_path / 'model.bst')
+    registry = ModelRegistry(tmp_path / 'registry.json', max_models=2)
+    for version in ['v1', 'v2']:
+        for key in ['bar_luka', 'caffe_bar_centar']:
+            registry.register(key, version, path, hot=True)
+
+    assert [registry.metadata('bar_luka', version)['hot'] for version in ['v1', 'v2']] == [False, True]
+    assert ModelRegistry(tmp_path / 'registry.json', max_models=2).preload() == [('bar_luka', 'v2'),
+                                                                                  ('caffe_bar_centar', 'v2')]
+
+
+def test_registry_sees_versions_registered_by_other_instance(tmp_path):
+    path = save_booster(tmp_path / 'model.bst')
+    reader = ModelRegistry(tmp_path / 'registry.json')
+    writer = ModelRegistry(tmp_path / 'registry.json')
+    writer.register('bar_luka', 'v1', path)
+    assert reader.versions('bar_luka') == ['v1']
+    reader.register('bar_luka', 'v2', path)
+    assert ModelRegistry(tmp_path / 'registry.json').versions('bar_luka') == ['v1', 'v2']